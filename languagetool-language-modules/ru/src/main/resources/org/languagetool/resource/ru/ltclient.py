@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+#
+# Client of LanguageTool HTTP server (languagetool-server.jar), used by
+# pymorph-generate-tags.py and generate-mystem-tags.py with option --server
+# instead of running languagetool-commandline.jar for each run.
+#
+# Words are sent in batches, several check requests are in flight at the
+# same time over persistent connections, and rule matches are taken
+# directly from JSON response. If server does not answer on local URL,
+# it is started from languagetool-server.jar and stopped at the end.
+
+import collections
+import concurrent.futures
+import contextlib
+import http.client
+import itertools
+import json
+import subprocess
+import threading
+import time
+import urllib.parse
+
+# Number of words sent in one check request
+BATCH_SIZE = 1000
+# Number of check requests in flight at the same time
+CONNECTIONS = 4
+# Seconds to wait for locally started server
+START_TIMEOUT = 120
+SERVER_CLASS = 'org.languagetool.server.HTTPServer'
+LOCAL_HOSTS = ('localhost', '127.0.0.1', '::1')
+
+
+class LTClient:
+
+    # Param url: server URL, i.e. http://localhost:8081
+    # Param rules: IDs of rules to check (only these rules are enabled)
+    def __init__(self, url, language='ru', rules=('Unknown_words',), batch_size=BATCH_SIZE,
+                 connections=CONNECTIONS, timeout=600):
+        parts = urllib.parse.urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == 'https' else 80)
+        self._https = parts.scheme == 'https'
+        self._path = parts.path.rstrip('/')
+        self._language = language
+        self._rules = ','.join(rules)
+        self._batch_size = batch_size
+        self._connections = connections
+        self._timeout = timeout
+        self._local = threading.local()
+
+    # Returns persistent connection of current thread
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn_class = http.client.HTTPSConnection if self._https else http.client.HTTPConnection
+            conn = conn_class(self.host, self.port, timeout=self._timeout)
+            self._local.conn = conn
+        return conn
+
+    def _request(self, method, path, body=None):
+        headers = { 'Content-Type': 'application/x-www-form-urlencoded' } if body else {}
+        # Server may close idle connection, so request is retried once on new connection
+        for attempt in (1, 2):
+            conn = self._connection()
+            try:
+                conn.request(method, self._path + path, body, headers)
+                resp = conn.getresponse()
+                data = resp.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                conn.close()
+                self._local.conn = None
+                if attempt == 2:
+                    raise
+        if resp.status != 200:
+            raise RuntimeError("LanguageTool server returned {}: {}".format(resp.status, data[:200]))
+        return json.loads(data.decode('utf-8'))
+
+    # Returns True if server answers
+    def is_alive(self):
+        try:
+            self._request('GET', '/v2/languages')
+            return True
+        except (OSError, RuntimeError, ValueError):
+            return False
+
+    # Returns list of rule matches in text
+    def check(self, text):
+        body = urllib.parse.urlencode({ 'language': self._language, 'text': text,
+            'enabledRules': self._rules, 'enabledOnly': 'true' })
+        return self._request('POST', '/v2/check', body)['matches']
+
+    # Checks each word in line made with line_format
+    # Words can be any iterable, only a few batches are kept in memory
+    # Adds words (parts of lines) marked by rules to marked, any container
+    # with add(), i.e. needtag.SpillingSet, new set by default
+    # Returns marked
+    def find_marked(self, words, marked=None, line_format="А {} а.\n"):
+        words = iter(words)
+        if marked is None:
+            marked = set()
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(self._connections) as executor:
+            while True:
+                batch = list(itertools.islice(words, self._batch_size))
+                if batch:
+                    text = "".join(line_format.format(word) for word in batch)
+                    pending.append((text, executor.submit(self.check, text)))
+                while pending and (len(pending) > self._connections or not batch):
+                    text, future = pending.popleft()
+                    # Offsets are in UTF-16 units, the same as characters for Cyrillic
+                    for match in future.result():
+                        marked.add(text[ match['offset']:match['offset'] + match['length'] ])
+                if not batch:
+                    break
+        return marked
+
+
+# Yields client of server at URL. Local server which does not answer is
+# started from server_jar and stopped on exit.
+@contextlib.contextmanager
+def open_client(url, server_jar, batch_size=BATCH_SIZE):
+    client = LTClient(url, batch_size=batch_size)
+    if client.is_alive() or client.host not in LOCAL_HOSTS:
+        yield client
+        return
+    print("Starting LanguageTool server on port {} ...".format(client.port))
+    process = subprocess.Popen(['java', '-cp', server_jar, SERVER_CLASS, '--port', str(client.port)])
+    try:
+        start = time.time()
+        while not client.is_alive():
+            if process.poll() is not None:
+                raise RuntimeError("LanguageTool server exited with code {}".format(process.returncode))
+            if time.time() - start > START_TIMEOUT:
+                raise RuntimeError("LanguageTool server did not start in {} s".format(START_TIMEOUT))
+            time.sleep(0.5)
+        yield client
+    finally:
+        process.terminate()
+        process.wait()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+#
+# mystem running as coprocess, used by generate-mystem-tags.py instead of
+# writing new-tag.txt, running mystem on it and reading mout.txt back.
+#
+# Words are written to mystem stdin by a separate thread, while output
+# lines are read from stdout and handed to caller as soon as they come,
+# so analysis overlaps with conversion of results. Any program reading
+# words from stdin and writing mystem output format can be used instead of
+# mystem (option --mystem of generate-mystem-tags.py).
+
+import subprocess
+import threading
+
+MYSTEM = './mystem'
+MYSTEM_OPTIONS = ('-nwi', '--eng-gr')
+# Number of words written to mystem at once
+BATCH_SIZE = 1000
+
+
+class Mystem:
+
+    def __init__(self, binary=MYSTEM, options=MYSTEM_OPTIONS, batch_size=BATCH_SIZE):
+        self._command = [ binary ] + list(options)
+        self._batch_size = batch_size
+
+    def _feed(self, stdin, words):
+        batch = []
+        try:
+            for word in words:
+                batch.append(word + "\n")
+                if len(batch) >= self._batch_size:
+                    stdin.write("".join(batch))
+                    batch = []
+            stdin.write("".join(batch))
+        except BrokenPipeError:
+            # mystem exited, error is reported by analyze()
+            pass
+        finally:
+            try:
+                stdin.close()
+            except BrokenPipeError:
+                pass
+
+    # Yields mystem output lines (with end of line) for words
+    def analyze(self, words):
+        process = subprocess.Popen(self._command, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                   encoding='utf-8')
+        feeder = threading.Thread(target=self._feed, args=(process.stdin, words), daemon=True)
+        feeder.start()
+        try:
+            yield from process.stdout
+        finally:
+            process.stdout.close()
+            feeder.join()
+            process.wait()
+        if process.returncode != 0:
+            raise RuntimeError("{} exited with code {}".format(" ".join(self._command), process.returncode))
+
+
+# Parses mystem output line "token{lemma=gramma|=gramma|lemma=gramma}"
+# Returns token and list of (lemma, gramma), lemma is kept from previous
+# analysis when it is left out
+def parse_line(line):
+    token, rest = line.split("{",1)
+    analyses = []
+    current_lemma = ""
+    for desc in rest.split("|"):
+        if desc[0] != "=":
+            current_lemma = desc.split("=",1)[0]
+        gramma = desc.split("=",1)[1]
+        if gramma[-2] == "}": gramma = gramma[:-2]
+        analyses.append((current_lemma, gramma))
+    return token, analyses
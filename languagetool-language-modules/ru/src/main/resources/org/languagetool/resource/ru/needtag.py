@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+#
+# Extraction of words from need-tag.txt for pymorph-generate-tags.py and
+# generate-mystem-tags.py.
+#
+# Input is read in large blocks of whole lines. Lines cut by "..." are
+# trimmed the same way as before, then all Cyrillic words of the block are
+# found with one precompiled regular expression. Distinct words are kept in
+# SpillingSet, which writes sorted runs to temporary files when it grows
+# over given number of words, and merges them when iterated, so memory
+# does not depend on size of input.
+
+import heapq
+import re
+import tempfile
+
+WORD_REGEX = re.compile(u"[\u0400-\u0500]+")
+# Size of block read at once, in characters
+BLOCK_SIZE = 16 * 1024 * 1024
+# Number of distinct words kept in memory
+MAX_WORDS = 1000000
+
+
+class SpillingSet:
+
+    def __init__(self, max_items=MAX_WORDS, tmp_dir=None):
+        self._items = set()
+        self._runs = []
+        self._max_items = max_items
+        self._tmp_dir = tmp_dir
+
+    def add(self, item):
+        self._items.add(item)
+        if len(self._items) >= self._max_items:
+            self._spill()
+
+    def _spill(self):
+        run = tempfile.TemporaryFile('w+', dir=self._tmp_dir, encoding='utf-8')
+        run.writelines(item + "\n" for item in sorted(self._items))
+        self._runs.append(run)
+        self._items = set()
+
+    def __bool__(self):
+        return bool(self._items or self._runs)
+
+    # Counts distinct items, merging runs the same way as iteration
+    def __len__(self):
+        return sum(1 for item in self)
+
+    # Yields distinct items in sorted order
+    def __iter__(self):
+        sources = [ iter(sorted(self._items)) ]
+        for run in self._runs:
+            run.seek(0)
+            sources.append(line[:-1] for line in run)
+        prev = None
+        for item in heapq.merge(*sources):
+            if item != prev:
+                yield item
+                prev = item
+
+    def close(self):
+        for run in self._runs:
+            run.close()
+        self._runs = []
+        self._items = set()
+
+
+# Removes words cut by "..." at start or end of line
+def trim_line(line):
+    if ' ' in line:
+        if "..." in line[:3]:
+            line = line.split(" ",1)[1]
+        if "..." in line:
+            line = line.rsplit(" ",1)[0]
+    return line
+
+
+# Yields blocks of whole lines
+def read_blocks(path, block_size=BLOCK_SIZE):
+    rest = ""
+    with open(path, 'r') as data_file:
+        while True:
+            block = data_file.read(block_size)
+            if not block:
+                break
+            end = block.rfind("\n")
+            if end < 0:
+                rest += block
+                continue
+            yield rest + block[:end]
+            rest = block[end + 1:]
+    if rest:
+        yield rest
+
+
+# Returns SpillingSet of lowercase words, which are not all uppercase
+def extract_words(path, max_words=MAX_WORDS, tmp_dir=None, block_size=BLOCK_SIZE):
+    words = SpillingSet(max_words, tmp_dir)
+    for block in read_blocks(path, block_size):
+        if "..." in block:
+            block = "\n".join(trim_line(line) if "..." in line else line for line in block.split("\n"))
+        for word in set(WORD_REGEX.findall(block)):
+            if word != word.upper():
+                words.add(word.lower())
+    return words
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+#
+# pymorphy2 analysis of words for pymorph-generate-tags.py.
+#
+# Words are read and analyzed in chunks, so they can come from any
+# iterable without being all kept in memory. With more jobs, chunks are
+# spread over a pool of processes, each with its own MorphAnalyzer, and
+# results are returned in order of chunks, so output is the same as with
+# one job.
+# Messages printed during analysis are returned with results and printed
+# by the caller, to keep them in the same order too.
+
+import collections
+import itertools
+import multiprocessing
+
+# to install optimized version use:
+# sudo pip install pymorphy2[fast]
+import pymorphy2
+
+import tagconv
+
+# Number of words analyzed by worker at once
+CHUNK_SIZE = 500
+
+_morph_ = None
+_converter_ = None
+_cache_stats_ = [0, 0]
+
+
+def init_worker():
+    global _morph_, _converter_
+    _morph_ = pymorphy2.MorphAnalyzer()
+    _converter_ = tagconv.TagConverter(tagconv.PYMORPHY_LT)
+
+
+# Returns analyzer name and version, used to invalidate cached analyses
+def analyzer_version():
+    return "pymorphy2 {}".format(pymorphy2.__version__)
+
+
+# Returns True if analysis comes from dictionary, possibly with known prefix
+def is_dictionary_analysis(data, entries):
+    if type(data.methods_stack[0][0]) is not pymorphy2.units.by_lookup.DictionaryAnalyzer:
+        return False
+    if len(data.methods_stack) > 1:
+        if type(data.methods_stack[1][0]) is pymorphy2.units.by_analogy.UnknownPrefixAnalyzer:
+            return False
+        if type(data.methods_stack[1][0]) is not pymorphy2.units.by_analogy.KnownPrefixAnalyzer:
+            entries.append(["Unexpected method stack:  {}".format(data.methods_stack)])
+            return False
+        if len(data.methods_stack) > 2:
+            if type(data.methods_stack[2][0]) is not pymorphy2.units.by_analogy.KnownPrefixAnalyzer:
+                entries.append(["Unexpected method stack:  {}".format(data.methods_stack)])
+                return False
+    return True
+
+
+# Returns analyses of word as list of entries [token, lemma, grammemes],
+# or [message] for messages printed during analysis
+def analyze_word(word):
+    entries = []
+    for data in _morph_.parse(word):
+        if is_dictionary_analysis(data, entries):
+            entries.append([data.word, data.normal_form, str(data.tag)])
+    return entries
+
+
+# Converts analyses of word to LT tags
+# Returns list of (token, lemma, LT tag, grammemes) and messages
+def convert_entries(entries, converter):
+    rows = []
+    messages = []
+    for entry in entries:
+        if len(entry) == 1:
+            messages.append(entry[0])
+            continue
+        token, lemma, tag = entry
+        gramma = tag.replace(" ",",")
+        pos_tag, error = converter.lookup(gramma)
+        if error:
+            messages.append("ERROR! Too many pos tags in "+gramma)
+        rows.append((token, lemma, pos_tag, tag))
+    return rows, messages
+
+
+# Analyzes chunk of words
+# Returns list of (entries, rows, messages) for each word and
+# (hits, misses) of tag conversion cache
+def analyze_chunk(words):
+    results = []
+    hits, misses, size = _converter_.cache_info()
+    for word in words:
+        entries = analyze_word(word)
+        results.append((entries,) + convert_entries(entries, _converter_))
+    new_hits, new_misses, size = _converter_.cache_info()
+    return results, (new_hits - hits, new_misses - misses)
+
+
+def _add_cache_stats(stats):
+    _cache_stats_[0] += stats[0]
+    _cache_stats_[1] += stats[1]
+
+
+# Yields (rows, messages) for each word, in order of words
+# Words can be any iterable, i.e. needtag.SpillingSet, they are read in
+# chunks and at most 2 * jobs chunks are analyzed at the same time
+# Param cache: optional wordcache.WordCache, only words not found in it are analyzed
+def analyze_words(words, jobs=1, chunk_size=CHUNK_SIZE, cache=None):
+    words = iter(words)
+    pending = collections.deque()
+    # Cached analyses are converted here
+    converter = tagconv.TagConverter(tagconv.PYMORPHY_LT)
+    pool = None
+    if jobs > 1:
+        # Calling script is not guarded by __main__ check, so workers have
+        # to be forked rather than started by re-running the script
+        pool = multiprocessing.get_context('fork').Pool(jobs, initializer=init_worker)
+    else:
+        init_worker()
+    try:
+        while True:
+            chunk = list(itertools.islice(words, chunk_size))
+            if chunk:
+                cached = cache.lookup_analyses(chunk) if cache is not None else dict()
+                missing = [ word for word in chunk if word not in cached ]
+                if pool is not None:
+                    result = pool.apply_async(analyze_chunk, (missing,))
+                else:
+                    result = analyze_chunk(missing)
+                pending.append((chunk, cached, result))
+            while pending and (len(pending) > 2 * jobs or not chunk):
+                done, cached, result = pending.popleft()
+                results, stats = result.get() if pool is not None else result
+                _add_cache_stats(stats)
+                results = iter(results)
+                for word in done:
+                    if word in cached:
+                        yield convert_entries(cached[ word ], converter)
+                    else:
+                        entries, rows, messages = next(results)
+                        if cache is not None:
+                            cache.store_analysis(word, entries)
+                        yield rows, messages
+            if not chunk:
+                break
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+    hits, misses, size = converter.cache_info()
+    _add_cache_stats((hits, misses))
+
+
+# Returns (hits, misses) of tag conversion caches of all workers
+def cache_info():
+    return tuple(_cache_stats_)
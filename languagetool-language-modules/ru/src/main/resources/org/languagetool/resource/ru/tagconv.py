@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+#
+# Conversion of pymorphy2 and mystem grammemes to LanguageTool tags,
+# used by pymorph-generate-tags.py and generate-mystem-tags.py.
+#
+# Grammeme string is split once into a frozenset. Mapping tables of one
+# analyzer are compiled into an inverted index grammeme => [(category, value)],
+# so only grammemes present in analysis are looked up. Resulting LT tag is
+# cached per grammeme set, since there are only a few thousand distinct
+# grammeme sets even in large word lists.
+#
+# Run this module directly to compare it with the previous per-table scan:
+#   python3 tagconv.py -a mystem -n 1000000
+
+import functools
+import itertools
+
+# Maximal number of grammeme sets kept in cache
+CACHE_SIZE = 16384
+
+# Order of categories in mapping tables
+CATEGORIES = ('pos', 'case', 'number', 'gender', 'tense', 'person', 'other')
+
+PYMORPHY_LT = {
+'separators': ',',
+
+'pos': {
+    'ADJF':'ADJ',#    прилагательное
+    'ADJS':'ADJ_Short',#    краткая форма
+    'COMP':'ADJ_Sup',#    сравнительная
+    'ADVB':'ADV',#    наречие
+    'GRND':'DPT',#  деепричастие
+    'PRTF':'PT', # причастие (полное)
+    'PRTS':'PT_Short', # краткое причастие - SHORT PARTICIPLE
+    'PRED':'none',#    предикатив    некогда
+    'INTJ':'INTERJECTION',#    междометие
+    'NUMR':'NumC',#    числительное
+    'NPRO':'PNN',#    местоимение-существительное
+    'PREP':'PREP',#    предлог
+    'CONJ':'CONJ',#    союз
+    'PRCL':'PARTICLE',#    частица
+    'NOUN':'NN',#    существительное
+    'INFN':'VB',#   глагол (инфинитив)
+    'VERB':'VB'},#    глагол
+
+'pos_other': [
+'ADJ',#    полная форма
+'PADJ',#    притяжательные прилагательные
+'ADJ_Comp',#    превосходная
+'NNN',#    имя собственное
+'NNP',#    отчество
+'NNF'#    фамилия
+              ],
+
+'tense': {
+    'pres':'Real',#    настоящее
+    'futr':'Fut',#    непрошедшее
+    'past':'Past',#    прошедшее
+    'INFN':'INF',#    инфинитив
+    'impr':'IMP'#    повелительное наклонение
+},
+
+'case': {
+    #Падеж
+    'nomn':'Nom',#    именительный
+    'gent':'R',#    родительный
+    'datv':'D',#    дательный
+    'accs':'V',#    винительный
+    'ablt':'T',#    творительный
+    'loct':'P',#    предложный
+    'gen2':'R',#    партитив (второй родительный)
+    'acc2':'V',#
+    'loc2':'P',#    местный (второй предложный)
+    'voct':'none'#    звательный
+},
+
+'number': {
+    #Число
+    'sing':'Sin',#    единственное число
+    'plur':'PL'#    множественное число
+},
+
+'person': {
+    #Лицо глагола
+    '1per':'P1',#    1-е лицо
+    '2per':'P2',#    2-е лицо
+    '3per':'P3'#    3-е лицо
+},
+
+'gender': {
+    #Род
+    'masc':'Masc',#	мужской род
+    'femn':'Fem',#	женский род
+    'neut':'Neut'#	средний род
+},
+# PRDC predicate
+# NumC - числительное количественное  - NUMERAL COUNTABLE
+# Ord - числительное порядковое - ORDINAL
+# PT_Short - краткое причастие - SHORT PARTICIPLE
+
+'other': {
+#Репрезентация и наклонение глагола
+'indic':'',#	изьявительное наклонение
+#Форма прилагательных
+'poss':'PADJ',#	притяжательные прилагательные
+#Степень сравнения
+'Supr':'ADJ_Comp',#	превосходная
+#Вид
+'ipf':'',#	несовершенный
+'pf':'',#	совершенный
+#Залог
+'act':'',#	действительный залог
+'pass':'',#	страдательный залог
+#Одушевленность
+'anim':'',#	одушевленное
+'inan':'',#	неодушевленное
+#Переходность
+'tran':'',#	переходный глагол
+'intr':'',#	непереходный глагол
+#Прочие обозначения
+'parenth':'',#	вводное слово
+'geo':'',#	географическое название
+'awkw':'',#	образование формы затруднено
+'Name':'NNN',#	имя собственное
+'dist':'',#	искаженная форма
+'mf':'',#	общая форма мужского и женского рода
+'obsc':'',#	обсценная лексика
+'Patr':'NNP',#	отчество
+'praed':'',#	предикатив
+'Infr':'Talk',#	разговорная форма
+'rare':'',#	редко встречающееся слово
+'Abbr':'ABR',#	сокращение
+'obsol':'',#	устаревшая форма
+'Surn':'NNF'#	фамилия
+}
+}
+
+MYSTEM_LT = {
+'separators': ',=',
+
+'pos': {
+    'A':'ADJ',#	прилагательное
+    'ADV':'ADV',#	наречие
+    'ADVPRO':'none',#	местоименное наречие
+    'ANUM':'none',#	числительное-прилагательное
+    'APRO':'none',#	местоимение-прилагательное
+    'COM':'none',#	часть композита - сложного слова
+    'CONJ':'CONJ',#	союз
+    'INTJ':'INTERJECTION',#	междометие
+    'NUM':'NumC',#	числительное
+    'PART':'PARTICLE',#	частица
+    'PR':'PREP',#	предлог
+    'S':'NN',#	существительное
+    'SPRO':'PNN',#	местоимение-существительное
+    'V':'VB'},#	глагол
+
+'pos_other': ['DPT',
+'PT',
+'ADJ_Short',#	краткая форма
+'ADJ',#	полная форма
+'PADJ',#	притяжательные прилагательные
+'ADJ_Comp',#	превосходная
+'ADJ_Sup',#	сравнительная
+'NNN',#	имя собственное
+'NNP',#	отчество
+'NNF'#	фамилия
+              ],
+
+'tense': {
+    'praes':'Real',#	настоящее
+    'inpraes':'Fut',#	непрошедшее
+    'praet':'Past',#	прошедшее
+    'inf':'INF',#	инфинитив
+    'imper':'IMP'#	повелительное наклонение
+},
+
+'case': {
+    #Падеж
+    'nom':'Nom',#	именительный
+    'gen':'R',#	родительный
+    'dat':'D',#	дательный
+    'acc':'V',#	винительный
+    'ins':'T',#	творительный
+    'abl':'P',#	предложный
+    'part':'R',#	партитив (второй родительный)
+    'loc':'P',#	местный (второй предложный)
+    'voc':'none'#	звательный
+},
+
+'number': {
+    #Число
+    'sg':'Sin',#	единственное число
+    'pl':'PL'#	множественное число
+},
+
+'person': {
+    #Лицо глагола
+    '1p':'P1',#	1-е лицо
+    '2p':'P2',#	2-е лицо
+    '3p':'P3'#	3-е лицо
+},
+
+'gender': {
+    #Род
+    'm':'Masc',#	мужской род
+    'f':'Fem',#	женский род
+    'n':'Neut'#	средний род
+},
+# PRDC predicate
+# NumC - числительное количественное  - NUMERAL COUNTABLE
+# Ord - числительное порядковое - ORDINAL
+# PT_Short - краткое причастие - SHORT PARTICIPLE
+
+'other': {
+#Репрезентация и наклонение глагола
+'ger':'DPT',#	деепричастие
+'partcp':'PT',#	причастие
+'indic':'',#	изьявительное наклонение
+#Форма прилагательных
+'brev':'ADJ_Short',#	краткая форма
+'plen':'ADJ',#	полная форма
+'poss':'PADJ',#	притяжательные прилагательные
+#Степень сравнения
+'supr':'ADJ_Comp',#	превосходная
+'comp':'ADJ_S',#	сравнительная
+#Вид
+'ipf':'',#	несовершенный
+'pf':'',#	совершенный
+#Залог
+'act':'',#	действительный залог
+'pass':'',#	страдательный залог
+#Одушевленность
+'anim':'',#	одушевленное
+'inan':'',#	неодушевленное
+#Переходность
+'tran':'',#	переходный глагол
+'intr':'',#	непереходный глагол
+#Прочие обозначения
+'parenth':'',#	вводное слово
+'geo':'',#	географическое название
+'awkw':'',#	образование формы затруднено
+'persn':'NNN',#	имя собственное
+'dist':'',#	искаженная форма
+'mf':'',#	общая форма мужского и женского рода
+'obsc':'',#	обсценная лексика
+'patrn':'NNP',#	отчество
+'praed':'',#	предикатив
+'inform':'Talk',#	разговорная форма
+'rare':'',#	редко встречающееся слово
+'abbr':'ABR',#	сокращение
+'obsol':'',#	устаревшая форма
+'famn':'NNF'#	фамилия
+}
+}
+
+
+class TagConverter:
+
+    # Param tables: mapping tables of one analyzer (PYMORPHY_LT or MYSTEM_LT)
+    # Param cache_size: number of grammeme sets kept in cache
+    def __init__(self, tables, cache_size=CACHE_SIZE):
+        self._separator = tables['separators'][0]
+        self._other_separators = tables['separators'][1:]
+        self._pos_other = frozenset(tables['pos_other'])
+        # Grammeme => list of (category, position in table, LT value)
+        self._index = dict()
+        for cat, name in enumerate(CATEGORIES):
+            for order, (key, value) in enumerate(tables[name].items()):
+                self._index.setdefault(key, []).append((cat, order, value))
+        self._convert = functools.lru_cache(maxsize=cache_size)(self._convert_grammemes)
+
+    # Splits grammeme string into set of grammemes
+    def parse(self, gramma):
+        for sep in self._other_separators:
+            gramma = gramma.replace(sep, self._separator)
+        return frozenset(gramma.split(self._separator))
+
+    # Returns (LT tag or 'UNKNOWN', error flag) for grammeme string
+    # Error flag is set if analysis has more values of some category
+    def lookup(self, gramma):
+        return self._convert(self.parse(gramma))
+
+    # Returns LT tag for grammeme string, or 'UNKNOWN'
+    def convert(self, gramma):
+        output, error = self.lookup(gramma)
+        if error:
+            print("ERROR! Too many pos tags in "+gramma)
+        return output
+
+    # Returns (hits, misses, size) of grammeme set cache
+    def cache_info(self):
+        info = self._convert.cache_info()
+        return info.hits, info.misses, info.currsize
+
+    # Returns LT values found for each category, in order of mapping tables
+    def _find_lists(self, grammemes):
+        found = [ [] for _ in CATEGORIES ]
+        for grammeme in grammemes:
+            for cat, order, value in self._index.get(grammeme, ()):
+                found[ cat ].append((order, value))
+        return [ [ value for order, value in sorted(values) ] or ['none'] for values in found ]
+
+    # Returns (LT tag, error flag) for set of grammemes
+    def _convert_grammemes(self, grammemes):
+        return make_tag(self._find_lists(grammemes), self._pos_other)
+
+
+# Builds LT tag from values found for each category
+# Returns (LT tag, error flag), tag is 'UNKNOWN' if it can not be built
+def make_tag(lists, pos_other):
+    pos, case, number, gender, tense, person, other = lists
+    other_pos = set(other) & pos_other
+
+    if len(pos) != 1 or len(case) > 1 or len(number) > 1 or len(gender) > 1 or len(tense) > 1 or len(person) > 1 or len(other_pos)>1:
+        return 'UNKNOWN', True
+    pos = pos[0]
+    if len(other_pos) != 0:
+        pos=other_pos.pop()
+    if  pos == 'none': return 'UNKNOWN', False
+
+    output = pos
+
+    if pos in ['NN','NNN','NNF','NNP']:
+        output+=":"+gender[0]+":"+number[0]+":"+case[0]
+        if 'Talk' in other:
+            output += ":Talk"
+    if pos in ['ADJ','ADJ_Com','ADJ_Short','PADJ']:
+        output+=":"+gender[0]
+        if number[0] != 'Sin':
+            output += ":"+number[0]
+        output+=":"+case[0]
+    if pos == 'DPT':
+        output+=":"+tense[0]
+    if pos == 'NumC':
+        output+=":"+case[0]
+    if pos in ['PT','PT_Short']:
+        output+=":"+tense[0]+":"+gender[0]
+        if number[0] != 'Sin':
+            output += ":"+number[0]
+        output+=":"+case[0]
+    if pos in ['VB']:
+        output+=":"+tense[0]
+        if tense[0]=='Past':
+            output+=":"+gender[0]
+            if number[0] != 'Sin':
+                output += ":"+number[0]
+        else:
+            output+=":"+number[0]+":"+person[0]
+
+    output = output.replace('none','')
+    if ('NN::' or '::Talk') not in output:
+        output = output.replace('::',':')
+        output = output.replace('::',':')
+    if output[-1] == ":":
+        output = output[:-1]
+    return output, False
+
+
+# Conversion as it was done in the scripts before, kept for benchmark only
+def _make_scan_converter(tables):
+    import re
+    pattern = '|'.join(re.escape(sep) for sep in tables['separators'])
+    def find_list(split, dic):
+        ret=[]
+        for key in dic.keys():
+            if key in split:
+                ret.append(dic[key])
+        if len(ret)==0: ret.append('none')
+        return ret
+    pos_other = set(tables['pos_other'])
+    def convert(gramma):
+        split = re.split(pattern, gramma)
+        output, error = make_tag([ find_list(split, tables[name]) for name in CATEGORIES ], pos_other)
+        if error:
+            print("ERROR! Too many pos tags in "+gramma)
+        return output
+    return convert
+
+
+# Makes random analyses: each has part of speech and some grammemes
+# of other categories, distinct analyses follow Zipf-like distribution
+def _make_analyses(tables, count, distinct, seed):
+    import random
+    rnd = random.Random(seed)
+    sep = tables['separators']
+    pool = []
+    for _ in range(distinct):
+        grammemes = [ rnd.choice(list(tables['pos'])) ]
+        for name in CATEGORIES[1:]:
+            if rnd.random() < 0.6:
+                grammemes.append(rnd.choice(list(tables[name])))
+        gramma = grammemes[0]
+        for grammeme in grammemes[1:]:
+            gramma += rnd.choice(sep) + grammeme
+        pool.append(gramma)
+    weights = list(itertools.accumulate(1 / rank for rank in range(1, distinct + 1)))
+    return rnd.choices(pool, cum_weights=weights, k=count)
+
+
+# Compares table scan and TagConverter on random analyses
+def _benchmark(analyzer, count, distinct, seed):
+    import contextlib
+    import io
+    import time
+    tables = PYMORPHY_LT if analyzer == 'pymorphy' else MYSTEM_LT
+    analyses = _make_analyses(tables, count, distinct, seed)
+    print("Converting {} {} analyses, {} distinct".format(count, analyzer, len(set(analyses))))
+    converter = TagConverter(tables)
+    results = []
+    for name, convert in (('scan', _make_scan_converter(tables)), ('tagconv', converter.convert)):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            results.append([ convert(gramma) for gramma in analyses ])
+            elapsed = time.perf_counter() - start
+        print("{:<10} {:>10.3f} s".format(name, elapsed))
+    print("Cache hits {}, misses {}, size {}".format(*converter.cache_info()))
+    if results[0] != results[1]:
+        print("ERROR: Results differ")
+
+
+# Run benchmark by running this module directly
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmarks conversion of grammemes to LanguageTool tags.')
+    parser.add_argument('-a', '--analyzer', choices=('pymorphy', 'mystem'), default='pymorphy')
+    parser.add_argument('-d', '--distinct', default=5000, type=int)
+    parser.add_argument('-n', '--analyses', default=1000000, type=int)
+    parser.add_argument('-s', '--seed',     default=1, type=int)
+    args = parser.parse_args()
+    _benchmark(args.analyzer, args.analyses, args.distinct, args.seed)
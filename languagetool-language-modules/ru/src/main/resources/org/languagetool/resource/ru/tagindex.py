@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+#
+# Index of Russian LT tagset (tags_russian.txt, copied to all_tags.txt),
+# used by pymorph-generate-tags.py and generate-mystem-tags.py.
+#
+# Tags are kept in a set for exact checks and in a trie of tag segments
+# (NN -> Patr -> Fem -> PL ...) for finding the longest valid prefix and
+# nearest valid tags of a rejected tag. Rejected tags are collected in
+# RejectedTags and written as one report at the end of run.
+
+import collections
+
+# Separator of tag segments
+TAG_SEP = ':'
+
+
+class _Node:
+    __slots__ = ('children', 'tag')
+
+    def __init__(self):
+        self.children = dict()
+        self.tag = None
+
+
+class TagsetIndex:
+
+    def __init__(self, tag_file):
+        self._tags = set()
+        self._root = _Node()
+        with open(tag_file, 'r') as data_file:
+            for data_line in data_file:
+                tag = data_line.rstrip('\n')
+                if tag:
+                    self.add(tag)
+
+    def add(self, tag):
+        self._tags.add(tag)
+        node = self._root
+        for segment in tag.split(TAG_SEP):
+            node = node.children.setdefault(segment, _Node())
+        node.tag = tag
+
+    def __contains__(self, tag):
+        return tag in self._tags
+
+    def __len__(self):
+        return len(self._tags)
+
+    # Returns node of longest valid prefix of tag and number of its segments
+    def _find_prefix(self, segments):
+        node = self._root
+        depth = 0
+        for segment in segments:
+            if segment not in node.children:
+                break
+            node = node.children[ segment ]
+            depth += 1
+        return node, depth
+
+    # Returns longest prefix of tag, which is also prefix of some valid tag
+    def longest_prefix(self, tag):
+        segments = tag.split(TAG_SEP)
+        node, depth = self._find_prefix(segments)
+        return TAG_SEP.join(segments[:depth])
+
+    def _collect(self, node):
+        stack = [ node ]
+        while stack:
+            node = stack.pop()
+            if node.tag is not None:
+                yield node.tag
+            stack.extend(node.children.values())
+
+    # Returns up to "limit" valid tags sharing longest prefix with tag,
+    # those with least number of different segments first
+    def suggest(self, tag, limit=3):
+        segments = tag.split(TAG_SEP)
+        node, depth = self._find_prefix(segments)
+        wanted = collections.Counter(segments)
+        def distance(candidate):
+            other = collections.Counter(candidate.split(TAG_SEP))
+            return sum(((wanted - other) + (other - wanted)).values())
+        return sorted(self._collect(node), key=lambda candidate: (distance(candidate), candidate))[:limit]
+
+
+class RejectedTags:
+
+    # Param index: TagsetIndex used for suggestions
+    # Param examples: number of example words kept for each tag
+    def __init__(self, index, examples=3):
+        self._index = index
+        self._examples = examples
+        self._counts = collections.Counter()
+        self._words = collections.defaultdict(list)
+
+    def add(self, tag, token, lemma, gramma):
+        self._counts[ tag ] += 1
+        if len(self._words[ tag ]) < self._examples:
+            self._words[ tag ].append("{} {} <== {}".format(token, lemma, gramma))
+
+    # Number of rejected analyses
+    def __len__(self):
+        return sum(self._counts.values())
+
+    # Number of distinct rejected tags
+    def distinct(self):
+        return len(self._counts)
+
+    # Writes report, most frequent tags first, one tag per line:
+    # count, tag, longest valid prefix, suggested tags, examples
+    def write(self, report_file):
+        with open(report_file, 'w') as report:
+            report.write("#count\ttag\tvalid prefix\tsuggestions\texamples\n")
+            for tag, count in sorted(self._counts.items(), key=lambda item: (-item[1], item[0])):
+                report.write("{}\t{}\t{}\t{}\t{}\n".format(count, tag, self._index.longest_prefix(tag),
+                    ",".join(self._index.suggest(tag)), " | ".join(self._words[ tag ])))
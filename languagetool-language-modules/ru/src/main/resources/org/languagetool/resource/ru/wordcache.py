@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+#
+# Persistent cache of unknown-word processing for pymorph-generate-tags.py
+# and generate-mystem-tags.py (option --cache FILE), kept in SQLite file.
+#
+# For each word cache records whether LanguageTool marked it as unknown,
+# and what analyzer returned for it. LT verdicts are dropped when tagset
+# file (all_tags.txt) changes, analyses are dropped when analyzer version
+# changes, so re-runs only check and analyze new words.
+
+import hashlib
+import itertools
+import json
+import sqlite3
+
+
+# Returns SHA-1 of file content
+def file_hash(path):
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+# Yields (word, 1 if word is in unknown else 0) for each checked word
+# Both checked and unknown are sorted, so they are merged in one pass
+def _mark_sorted(checked, unknown):
+    unknown = iter(unknown)
+    current = next(unknown, None)
+    for word in checked:
+        while current is not None and current < word:
+            current = next(unknown, None)
+        yield word, int(word == current)
+
+
+class WordCache:
+
+    # Param tagset_hash: hash of tagset file, see file_hash()
+    # Param analyzer: analyzer name and version, i.e. "pymorphy2 0.8"
+    def __init__(self, path, tagset_hash, analyzer):
+        self._db = sqlite3.connect(path)
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS verdicts (word TEXT PRIMARY KEY, unknown INTEGER)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS analyses (word TEXT PRIMARY KEY, data TEXT)")
+        self._invalidate('tagset', tagset_hash, 'verdicts')
+        self._invalidate('analyzer', analyzer, 'analyses')
+        self._db.commit()
+        self.verdict_hits = 0
+        self.verdict_misses = 0
+        self.analysis_hits = 0
+        self.analysis_misses = 0
+
+    def _invalidate(self, key, value, table):
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        if row is not None and row[0] == value:
+            return
+        if row is not None:
+            print("Cache: {} changed, dropping cached {}".format(key, table))
+        self._db.execute("DELETE FROM {}".format(table))
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES (?, ?)", (key, value))
+
+    def _select(self, table, words):
+        words = list(words)
+        found = dict()
+        # SQLite limits number of query parameters
+        for ind in range(0, len(words), 500):
+            part = words[ ind:ind + 500 ]
+            found.update(self._db.execute("SELECT * FROM {} WHERE word IN ({})".format(
+                table, ",".join("?" * len(part))), part))
+        return found
+
+    # Adds words cached as unknown to unknown and words not in cache to
+    # missing, both need add(), i.e. needtag.SpillingSet
+    # Words can be any iterable, it is read only once
+    def lookup_verdicts(self, words, unknown, missing):
+        words = iter(words)
+        while True:
+            part = list(itertools.islice(words, 500))
+            if not part:
+                break
+            found = self._select('verdicts', part)
+            for word in part:
+                if word not in found:
+                    missing.add(word)
+                    self.verdict_misses += 1
+                elif found[ word ]:
+                    unknown.add(word)
+            self.verdict_hits += len(found)
+
+    # Stores verdicts of checked words, unknown are words marked by LT
+    # Both are iterated once in sorted order, i.e. needtag.SpillingSet
+    def store_verdicts(self, checked, unknown):
+        self._db.executemany("INSERT OR REPLACE INTO verdicts VALUES (?, ?)", _mark_sorted(checked, unknown))
+        self._db.commit()
+
+    # Returns dictionary word => analysis (any JSON serializable value)
+    # for cached words
+    def lookup_analyses(self, words):
+        found = dict((word, json.loads(data)) for word, data in self._select('analyses', words).items())
+        self.analysis_hits += len(found)
+        self.analysis_misses += len(words) - len(found)
+        return found
+
+    # Yields (word, analysis) for cached words and adds other words to
+    # missing, which needs add(), i.e. needtag.SpillingSet
+    # Words can be any iterable, it is read only once
+    def iter_analyses(self, words, missing):
+        words = iter(words)
+        while True:
+            part = list(itertools.islice(words, 500))
+            if not part:
+                break
+            found = self.lookup_analyses(part)
+            for word in part:
+                if word in found:
+                    yield word, found[ word ]
+                else:
+                    missing.add(word)
+
+    def store_analysis(self, word, analysis):
+        self._db.execute("INSERT OR REPLACE INTO analyses VALUES (?, ?)", (word, json.dumps(analysis, ensure_ascii=False)))
+
+    # Stores analysis for words, which have no analysis stored yet
+    def store_default_analysis(self, words, analysis):
+        data = json.dumps(analysis, ensure_ascii=False)
+        self._db.executemany("INSERT OR IGNORE INTO analyses VALUES (?, ?)", ((word, data) for word in words))
+
+    def close(self):
+        self._db.commit()
+        self._db.close()
+
+    def stats(self):
+        return "Cache: LT verdicts {} cached, {} checked; analyses {} cached, {} analyzed".format(
+            self.verdict_hits, self.verdict_misses, self.analysis_hits, self.analysis_misses)
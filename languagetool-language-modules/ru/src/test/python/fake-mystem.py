@@ -0,0 +1,23 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+#
+# Stand-in for mystem, for testing generate-mystem-tags.py and mystemproc.py
+# without mystem binary (option --mystem with path of this file).
+#
+# Reads words from stdin, one per line, and writes for each word a line in
+# mystem -nwi --eng-gr format: "word{word=S,m,inan=nom,sg|=acc,sg}", with the
+# word as its own lemma. Words ending with "?" are written as unknown to
+# mystem: "word{word??}". Options are accepted and ignored.
+
+import sys
+
+for line in sys.stdin:
+    word = line.strip()
+    if not word:
+        continue
+    if word.endswith("?"):
+        word = word[:-1]
+        print(word + "{" + word + "??}")
+    else:
+        print(word + "{" + word + "=S,m,inan=nom,sg|=acc,sg}")
+    sys.stdout.flush()
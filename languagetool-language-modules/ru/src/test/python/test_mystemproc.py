@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: UTF-8 -*-
+#
+# Smoke test of mystemproc.py, runs Mystem with fake-mystem.py instead of
+# mystem binary.
+#
+# Usage:
+#    python3 test_mystemproc.py
+
+import os
+import sys
+import unittest
+
+TEST_DIR = os.path.dirname(os.path.abspath(__file__))
+SCRIPT_DIR = os.path.join(TEST_DIR, '..', '..', 'main', 'resources', 'org', 'languagetool', 'resource', 'ru')
+FAKE_MYSTEM = os.path.join(TEST_DIR, 'fake-mystem.py')
+
+sys.path.insert(0, SCRIPT_DIR)
+import mystemproc
+
+
+class MystemTest(unittest.TestCase):
+
+    def setUp(self):
+        self.mystem = mystemproc.Mystem(sys.executable, [ FAKE_MYSTEM ] + list(mystemproc.MYSTEM_OPTIONS),
+                                        batch_size=2)
+
+    def test_analyze(self):
+        words = [ "дом", "кот", "пёс" ]
+        lines = list(self.mystem.analyze(iter(words)))
+        self.assertEqual(lines, [ word + "{" + word + "=S,m,inan=nom,sg|=acc,sg}\n" for word in words ])
+        token, analyses = mystemproc.parse_line(lines[1])
+        self.assertEqual(token, "кот")
+        self.assertEqual(analyses, [ ("кот", "S,m,inan=nom,sg"), ("кот", "acc,sg") ])
+
+    def test_unknown(self):
+        self.assertEqual(list(self.mystem.analyze([ "абв?" ])), [ "абв{абв??}\n" ])
+
+    def test_no_words(self):
+        self.assertEqual(list(self.mystem.analyze([])), [])
+
+    def test_exit_code(self):
+        mystem = mystemproc.Mystem(sys.executable, [ "-c", "import sys; sys.exit(3)" ])
+        with self.assertRaises(RuntimeError):
+            list(mystem.analyze([ "дом" ]))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,23 +2,217 @@
 
 # this will convert Slovak language tags as used in the Slovak
 # National Corpus into slightly simpler ones
+#
+# Input (lemma, form, tag separated by TAB) is read from stdin in large
+# blocks of lines and written to stdout in blocks. Converted tags are
+# memoized, since there are only about 1500 distinct tags in the corpus.
+# With --jobs N blocks are converted by N processes, output keeps order
+# of input. Run with --benchmark N to compare with line by line conversion.
+#
+# At the end a report (distinct tags, tag cache hit rate, skipped lines,
+# rows per second) is written to stderr or to file given by --report.
 
-import sys, re
+import argparse
+import collections
+import multiprocessing
+import sys
+import time
 
-for l in sys.stdin:
-    lemma, form, tag = l.strip().split('\t')
-    if lemma.startswith('*'):
-        lemma = lemma[1:]
-    if form.startswith('*'):
-        # preskoci "zle" tvary
-        # TODO - ako povedat, ze ma na ne upozornit?
-        continue
+# Size of block read at once, in characters
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# Maximal number of memoized tags
+TAG_CACHE_SIZE = 65536
+
+# L-participle: all persons are unified under 'o'
+PERSON_TABLE = str.maketrans('abc', 'ooo')
+
+_tags_ = dict()
+
+
+def convert_tag(tag):
     ntag = tag # upravime trosku tag
     if tag.startswith('VL'):
-        if 'p' in tag:
-            # neda sa urcit rod
-            ntag = re.sub('[hmifno]', 'o', ntag)
-        ntag = re.sub('[abc]', 'o', tag)
+        # neda sa urcit rod - unifying genders in plural ('[hmifno]' => 'o'
+        # when tag contains 'p') has always been overwritten by persons
+        # unified in original tag, so it is left out to keep the output
+        ntag = tag.translate(PERSON_TABLE)
 #    ntag = ntag.replace('+', 'P')
 #    ntag = ntag.replace('-', 'N')
-    print (form, lemma, ntag, sep='\t')
+    return ntag
+
+
+# Converts block of lines
+# Returns converted lines as one string and statistics
+# (lines, skipped lines, tag cache hits, list of tags missing in cache)
+def convert_block(block):
+    out = []
+    tags = _tags_
+    lines = 0
+    skipped = 0
+    missed = []
+    for l in block.split('\n'):
+        lines += 1
+        lemma, form, tag = l.strip().split('\t')
+        if lemma.startswith('*'):
+            lemma = lemma[1:]
+        if form.startswith('*'):
+            # preskoci "zle" tvary
+            # TODO - ako povedat, ze ma na ne upozornit?
+            skipped += 1
+            continue
+        ntag = tags.get(tag)
+        if ntag is None:
+            ntag = convert_tag(tag)
+            missed.append(tag)
+            if len(tags) < TAG_CACHE_SIZE:
+                tags[ tag ] = ntag
+        out.append(form + '\t' + lemma + '\t' + ntag + '\n')
+    return ''.join(out), (lines, skipped, lines - skipped - len(missed), missed)
+
+
+class Stats:
+
+    def __init__(self):
+        self.start = time.time()
+        self.lines = 0
+        self.skipped = 0
+        self.hits = 0
+        self.misses = 0
+        self.tags = set()
+
+    def add(self, stats):
+        lines, skipped, hits, missed = stats
+        self.lines += lines
+        self.skipped += skipped
+        self.hits += hits
+        self.misses += len(missed)
+        self.tags.update(missed)
+
+    def report(self, outfile):
+        elapsed = time.time() - self.start
+        rows = self.lines - self.skipped
+        lookups = self.hits + self.misses
+        outfile.write("filter_lft: {} lines read, {} rows written, {} lines skipped (* forms)\n".format(
+            self.lines, rows, self.skipped))
+        outfile.write("filter_lft: {} distinct tags, tag cache hit rate {:.2f} % ({} hits, {} misses)\n".format(
+            len(self.tags), 100.0 * self.hits / lookups if lookups else 0, self.hits, self.misses))
+        outfile.write("filter_lft: {:.1f} s, {:.0f} rows/s\n".format(elapsed, rows / elapsed if elapsed > 0 else 0))
+
+
+# Yields blocks of whole lines (without last end of line)
+def read_blocks(infile, block_size=BLOCK_SIZE):
+    rest = ''
+    while True:
+        block = infile.read(block_size)
+        if not block:
+            break
+        end = block.rfind('\n')
+        if end < 0:
+            rest += block
+            continue
+        yield rest + block[:end]
+        rest = block[end + 1:]
+    if rest:
+        yield rest
+
+
+# Returns Stats
+def convert(infile, outfile, jobs=1, block_size=BLOCK_SIZE):
+    stats = Stats()
+    if jobs <= 1:
+        for block in read_blocks(infile, block_size):
+            text, block_stats = convert_block(block)
+            outfile.write(text)
+            stats.add(block_stats)
+        return stats
+    # Only limited number of blocks is read ahead
+    with multiprocessing.Pool(jobs) as pool:
+        pending = collections.deque()
+        for block in read_blocks(infile, block_size):
+            pending.append(pool.apply_async(convert_block, (block,)))
+            while len(pending) > 2 * jobs or (pending and pending[0].ready()):
+                text, block_stats = pending.popleft().get()
+                outfile.write(text)
+                stats.add(block_stats)
+        while pending:
+            text, block_stats = pending.popleft().get()
+            outfile.write(text)
+            stats.add(block_stats)
+    return stats
+
+
+# Line by line conversion as it was done before, kept for benchmark only
+def _convert_lines(infile, outfile):
+    import re
+    for l in infile:
+        lemma, form, tag = l.strip().split('\t')
+        if lemma.startswith('*'):
+            lemma = lemma[1:]
+        if form.startswith('*'):
+            continue
+        ntag = tag
+        if tag.startswith('VL'):
+            if 'p' in tag:
+                ntag = re.sub('[hmifno]', 'o', ntag)
+            ntag = re.sub('[abc]', 'o', tag)
+        print (form, lemma, ntag, sep='\t', file=outfile)
+
+
+# Makes synthetic corpus similar to SNK morphological data
+def _make_corpus(lines, seed):
+    import random
+    rnd = random.Random(seed)
+    tags = [ 'VL' + a + n + p + g + s for a in 'dej' for n in 'sp' for p in 'abc' for g in 'hmifno' for s in '+-' ]
+    tags += [ 'SS' + g + n + c for g in 'mifn' for n in 'sp' for c in '1234567' ]
+    tags += [ 'AA' + g + n + c + d for g in 'mifn' for n in 'sp' for c in '1234567' for d in 'xyz' ]
+    tags += [ 'VK' + a + n + p + s for a in 'dej' for n in 'sp' for p in 'abc' for s in '+-' ]
+    letters = 'aábcčdďeéfghiíjklľmnňoópqrŕsštťuúvwxyýzž'
+    out = []
+    for _ in range(lines):
+        lemma = ''.join(rnd.choice(letters) for _ in range(rnd.randint(2, 10)))
+        form = lemma + rnd.choice(('', 'a', 'ou', 'ami', 'och', 'la', 'li'))
+        if rnd.random() < 0.02:
+            lemma = '*' + lemma
+        if rnd.random() < 0.02:
+            form = '*' + form
+        out.append('{}\t{}\t{}\n'.format(lemma, form, rnd.choice(tags)))
+    return ''.join(out)
+
+
+def _benchmark(lines, jobs, seed):
+    import io
+    corpus = _make_corpus(lines, seed)
+    print("Synthetic corpus: {} lines, {:.1f} MB".format(lines, len(corpus) / 1e6))
+    results = []
+    methods = [ ('line by line', _convert_lines), ('blocks', convert) ]
+    if jobs > 1:
+        methods.append(('blocks, {} jobs'.format(jobs), lambda infile, outfile: convert(infile, outfile, jobs)))
+    for name, method in methods:
+        outfile = io.StringIO()
+        start = time.perf_counter()
+        method(io.StringIO(corpus), outfile)
+        elapsed = time.perf_counter() - start
+        results.append(outfile.getvalue())
+        print("{:<20} {:>10.3f} s".format(name, elapsed))
+    if any(result != results[0] for result in results):
+        print("ERROR: Results differ")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Converts Slovak National Corpus tags (stdin to stdout).')
+    parser.add_argument('-b', '--block-size', default=BLOCK_SIZE, type=int)
+    parser.add_argument('-j', '--jobs', default=1, type=int)
+    parser.add_argument('-r', '--report', default=None, help='file for report, stderr by default')
+    parser.add_argument('--benchmark', default=0, type=int, metavar='LINES',
+                        help='compare with line by line conversion on synthetic corpus')
+    args = parser.parse_args()
+    if args.benchmark:
+        _benchmark(args.benchmark, args.jobs, 1)
+    else:
+        stats = convert(sys.stdin, sys.stdout, args.jobs, args.block_size)
+        if args.report:
+            with open(args.report, 'w') as report:
+                stats.report(report)
+        else:
+            stats.report(sys.stderr)
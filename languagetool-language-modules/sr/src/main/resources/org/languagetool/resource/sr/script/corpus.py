@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Compact representation of Serbian word corpus rows, shared by lex2pos.py,
+wic2pos.py, pos2lt.py and makewordlist.py.
+
+Row of word corpus is:
+
+wordform   lemma   tag   frequency
+
+Lemmas and tags repeat heavily (each lemma has many wordforms and there are
+only a few thousand distinct tags), so:
+
+    Row    - single row with __slots__, lemma and tag are interned strings
+    Corpus - rows kept column-wise, when whole corpus has to be held in
+             memory: wordforms in a list, lemmas and tags as integer ids
+             into string tables and frequencies, each in array('I')
+
+Run as program to compare memory used by corpus held as split lines,
+as Row objects and as Corpus:
+
+    ./corpus.py --rows 10000000
+"""
+
+import argparse
+import array
+import sys
+
+
+class Row:
+
+    __slots__ = ('form', 'lemma', 'tag', 'frequency')
+
+    # Frequency None means that row has no frequency column
+    def __init__(self, form, lemma, tag, frequency=None):
+        self.form = form
+        self.lemma = sys.intern(lemma)
+        self.tag = sys.intern(tag)
+        self.frequency = frequency
+
+    # Makes row from line split on <TAB>, frequency is taken from
+    # fourth column if there is one
+    @classmethod
+    def from_tokens(cls, tokens):
+        return cls(tokens[0], tokens[1], tokens[2], int(tokens[3]) if len(tokens) > 3 else None)
+
+    # Returns row as line of corpus file
+    def line(self):
+        if self.frequency is None:
+            return "{}\t{}\t{}\n".format(self.form, self.lemma, self.tag)
+        return "{}\t{}\t{}\t{}\n".format(self.form, self.lemma, self.tag, self.frequency)
+
+    def __eq__(self, other):
+        return (self.form, self.lemma, self.tag, self.frequency) == (other.form, other.lemma, other.tag, other.frequency)
+
+    def __repr__(self):
+        return "Row({!r}, {!r}, {!r}, {!r})".format(self.form, self.lemma, self.tag, self.frequency)
+
+
+class StringTable:
+
+    __slots__ = ('_ids', '_strings')
+
+    def __init__(self):
+        self._ids = dict()
+        self._strings = list()
+
+    # Returns id of string, adding it to table if needed
+    def id(self, string):
+        ind = self._ids.get(string)
+        if ind is None:
+            ind = len(self._strings)
+            self._ids[ string ] = ind
+            self._strings.append(string)
+        return ind
+
+    def __getitem__(self, ind):
+        return self._strings[ ind ]
+
+    def __len__(self):
+        return len(self._strings)
+
+
+class Corpus:
+
+    def __init__(self):
+        self.forms = list()
+        self.lemmas = array.array('I')
+        self.tags = array.array('I')
+        self.frequencies = array.array('I')
+        self.lemma_table = StringTable()
+        self.tag_table = StringTable()
+
+    # Adds row, missing frequency is kept as 0
+    def add(self, form, lemma, tag, frequency=0):
+        self.forms.append(form)
+        self.lemmas.append(self.lemma_table.id(lemma))
+        self.tags.append(self.tag_table.id(tag))
+        self.frequencies.append(frequency or 0)
+
+    def append(self, row):
+        self.add(row.form, row.lemma, row.tag, row.frequency)
+
+    def __len__(self):
+        return len(self.forms)
+
+    def __getitem__(self, ind):
+        return Row(self.forms[ ind ], self.lemma_table[ self.lemmas[ ind ] ],
+                   self.tag_table[ self.tags[ ind ] ], self.frequencies[ ind ])
+
+    def __iter__(self):
+        lemma_table, tag_table = self.lemma_table, self.tag_table
+        for form, lemma, tag, frequency in zip(self.forms, self.lemmas, self.tags, self.frequencies):
+            yield Row(form, lemma_table[ lemma ], tag_table[ tag ], frequency)
+
+    # Returns row as line of corpus file
+    def line(self, ind):
+        return "{}\t{}\t{}\t{}\n".format(self.forms[ ind ], self.lemma_table[ self.lemmas[ ind ] ],
+            self.tag_table[ self.tags[ ind ] ], self.frequencies[ ind ])
+
+    # Yields rows sorted by their lines, without duplicate lines if unique is set
+    def sorted_rows(self, unique=False):
+        prev = None
+        for ind in sorted(range(len(self)), key=self.line):
+            row = self[ ind ]
+            if unique and row == prev:
+                continue
+            prev = row
+            yield row
+
+    # Returns approximate memory used by corpus, in bytes
+    def memory(self):
+        size = sum(sys.getsizeof(x) for x in (self.forms, self.lemmas, self.tags, self.frequencies))
+        size += sum(sys.getsizeof(form) for form in self.forms)
+        for table in (self.lemma_table, self.tag_table):
+            size += sys.getsizeof(table._ids) + sys.getsizeof(table._strings)
+            size += sum(sys.getsizeof(string) for string in table._strings)
+        return size
+
+
+# Yields lines of synthetic corpus: about 20 wordforms per lemma and
+# 2000 distinct tags
+def _make_lines(rows, seed):
+    import random
+    rnd = random.Random(seed)
+    letters = 'абвгдђежзијклљмнњопрстћуфхцчџш'
+    tags = [ 'N' + ''.join(rnd.choice('cpmfnsgdavil') for _ in range(4)) for _ in range(2000) ]
+    endings = ('', 'а', 'у', 'ом', 'е', 'има', 'ама', 'ог', 'ој', 'их')
+    cnt = 0
+    while cnt < rows:
+        lemma = ''.join(rnd.choice(letters) for _ in range(rnd.randint(3, 10)))
+        for _ in range(min(rnd.randint(5, 35), rows - cnt)):
+            cnt += 1
+            yield "{}\t{}\t{}\t{}\n".format(lemma + rnd.choice(endings), lemma, rnd.choice(tags), rnd.randint(0, 100000))
+
+
+def _hold_lists(lines):
+    return [ line.strip().split('\t') for line in lines ]
+
+
+def _hold_rows(lines):
+    return [ Row.from_tokens(line.strip().split('\t')) for line in lines ]
+
+
+def _hold_corpus(lines):
+    corpus = Corpus()
+    for line in lines:
+        tokens = line.strip().split('\t')
+        corpus.add(tokens[0], tokens[1], tokens[2], int(tokens[3]))
+    return corpus
+
+
+# Measures peak memory (max RSS) of child process holding corpus
+def _measure(method, rows, seed, queue):
+    import resource
+    import time
+    start_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    start = time.perf_counter()
+    held = method(_make_lines(rows, seed))
+    elapsed = time.perf_counter() - start
+    queue.put((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - start_rss, elapsed, len(held)))
+
+
+def _benchmark(rows, seed):
+    import multiprocessing
+    print("Synthetic corpus: {} rows".format(rows))
+    methods = [ ('split lines', _hold_lists), ('Row objects', _hold_rows), ('Corpus', _hold_corpus) ]
+    for name, method in methods:
+        # Each method runs in its own process, so peak memory is not shared
+        queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_measure, args=(method, rows, seed, queue))
+        process.start()
+        rss, elapsed, held = queue.get()
+        process.join()
+        print("{:<15} {:>10.1f} MB {:>8.1f} B/row {:>10.1f} s".format(name, rss / 1024, rss * 1024 / held, elapsed))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compares memory used by Serbian word corpus held in memory.')
+    parser.add_argument('-r', '--rows', default=1000000, type=int)
+    parser.add_argument('-s', '--seed', default=1, type=int)
+    args = parser.parse_args()
+    _benchmark(args.rows, args.seed)
@@ -4,16 +4,40 @@
 """
 Program reads input file line by line, parsing line conforming to Serbian word corpus entries.
 Existence of words in each line is tested against database. If word is not found, it is inserted.
+In plain serial mode (without -u and -w) insertion is only logged: insert_word_in_db is a stub,
+which does not write to database. Bulk and parallel modes insert with word_insert_batch query.
+
+In bulk mode (option -u) lines are read in batches. Each batch is copied into temporary table
+and missing words are found with one query per batch. Bulk mode needs following queries
+in section [DB] of configuration file:
+
+word_exists_batch - returns (wordform, lemma, msd, frequency) rows of temporary table
+                    csv2pg_batch, which are not in database, i.e.
+                    SELECT b.* FROM csv2pg_batch b WHERE NOT EXISTS (SELECT 1 FROM ...)
+word_insert_batch - optional, inserts rows with psycopg2.extras.execute_values, i.e.
+                    INSERT INTO ... (wordform, lemma, msd, frequency) VALUES %%s
+Character "%" has to be written as "%%" in configuration file.
+
+With option -w batches are checked by parallel workers, each on its own connection
+taken from connection pool (see dbpool.py, which also allows SQLite in place of PostgreSQL).
+Each batch is then committed separately. Rows of batches that failed are written to per-worker
+error files, which are appended to output file at the end. This mode is tested against SQLite
+by src/test/python/test_csv2pg.py of the Serbian module.
 """
 
 import argparse
+import concurrent.futures
 import configparser
+import itertools
 import logging
 import os
-import psycopg2
+import shutil
 import sys
+import threading
+import time
 
 # Custom modules section
+import dbpool
 import srptagging
 
 _args_ = None
@@ -29,6 +53,10 @@ def parse_args():
     parser.add_argument('-i', '--input-file',    default=None)
     parser.add_argument('-n', '--first-n-lines', default=0, type=int)
     parser.add_argument('-o', '--output-dir',    default='/tmp')
+    parser.add_argument('-s', '--batch-size',    default=5000, type=int)
+    parser.add_argument('-t', '--commit-batches', default=1, type=int)
+    parser.add_argument('-u', '--bulk',          action ='store_true', default=False)
+    parser.add_argument('-w', '--workers',       default=1, type=int)
 
     global _args_, _logger_
     _args_ = parser.parse_args()
@@ -75,11 +103,11 @@ def open_out_file():
         sys.exit(1)
 
 def open_database():
-    global _conn_, _cursor_
+    global _pool_, _conn_, _cursor_
     _logger_.debug("Opening database '{}' as user '{}' ...".format(
-        _config_['DB']['database'], _config_['DB']['username']))
-    _conn_ = psycopg2.connect("dbname={} user={}".format(
-        _config_['DB']['database'], _config_['DB']['username']))
+        _config_['DB']['database'], _config_['DB'].get('username')))
+    _pool_ = dbpool.open_pool(_config_['DB'], max(_args_.workers, 1) + 1)
+    _conn_ = _pool_.getconn()
     _cursor_ = _conn_.cursor()
 
 
@@ -101,7 +129,8 @@ def close_database():
     _logger_.debug("Closing database ...")
     _cursor_.close()
     _conn_.commit()
-    _conn_.close()
+    _pool_.putconn(_conn_)
+    _pool_.closeall()
 
 
 # Checks for specially defined word types - i.e. reflexive verbs
@@ -151,12 +180,183 @@ def parse_file():
     _logger_.info("Skipped lines are in output file.")
 
 
+# Reads input file in batches of (wordform, lemma, msd, frequency) tuples
+# Filtered lines are written to output file
+def read_batches():
+    cnt = 0
+    batch = []
+    with open(_args_.input_file) as f:
+        for line in f:
+            # Remove end of line
+            line = line.strip()
+            cnt += 1
+            # Get words, tags etc.
+            lparts = line.split('\t')
+            if len(lparts) == 4:
+                if not is_filtered(line):
+                    batch.append(tuple(lparts))
+                    if len(batch) >= _args_.batch_size:
+                        yield cnt, batch
+                        batch = []
+                else:
+                    # Line should be skipped, write to output file
+                    _logger_.debug("Skipping filtered line '{}' ...".format(line))
+                    _out_file_.write(line.encode('utf-8'))
+            else:
+                _logger_.warn("Non-compliant line, skipping: '{}' ...".format(lparts))
+            if cnt > _args_.first_n_lines > 0:
+                break
+        f.close()
+    yield cnt, batch
+
+
+# Copies batch into temporary table and returns rows which are not in database
+def find_missing_words(cursor, batch):
+    _pool_.load_batch(cursor, batch)
+    cursor.execute(_config_['DB']['word_exists_batch'])
+    # Same word can be more than once in batch
+    return list(dict.fromkeys(tuple(row) for row in cursor.fetchall()))
+
+
+def insert_words_in_db(cursor, rows):
+    if 'word_insert_batch' in _config_['DB']:
+        _pool_.insert_rows(cursor, _config_['DB']['word_insert_batch'], rows, _args_.batch_size)
+    for row in rows:
+        _logger_.debug("Inserted: ({}, {}, {}, {})".format(*row))
+
+
+# Parse input file in batches
+def parse_file_bulk():
+    rows = 0
+    inserted = 0
+    batches = 0
+    _logger_.info("Started processing input file '{}' in batches of {} lines ...".format(
+        _args_.input_file, _args_.batch_size))
+    _pool_.create_batch_table(_cursor_)
+    start = time.time()
+    for cnt, batch in read_batches():
+        if not batch:
+            continue
+        missing = find_missing_words(_cursor_, batch)
+        insert_words_in_db(_cursor_, missing)
+        batches += 1
+        rows += len(batch)
+        inserted += len(missing)
+        if _args_.commit_batches > 0 and batches % _args_.commit_batches == 0:
+            _conn_.commit()
+        elapsed = time.time() - start
+        _logger_.info("Batch {}: {} lines read, {} rows checked, {} inserted, {:.0f} rows/s".format(
+            batches, cnt, rows, inserted, rows / elapsed if elapsed > 0 else 0))
+    elapsed = time.time() - start
+    _logger_.info("Finished processing input file '{}': {} rows checked, {} inserted in {:.1f} s ({:.0f} rows/s).".format(
+        _args_.input_file, rows, inserted, elapsed, rows / elapsed if elapsed > 0 else 0))
+    _logger_.info("Skipped lines are in output file.")
+
+
+_worker_ = threading.local()
+_worker_ids_ = itertools.count(1)
+_worker_files_ = []
+_worker_lock_ = threading.Lock()
+
+
+# Error file of current worker thread, opened on first use
+def get_worker_err_file():
+    if not hasattr(_worker_, 'err_file'):
+        with _worker_lock_:
+            _worker_.id = next(_worker_ids_)
+            name = os.path.join(_args_.output_dir, "{}.worker{}.err".format(
+                os.path.basename(_args_.input_file), _worker_.id))
+            _worker_.err_file = open(name, "wb")
+            _worker_files_.append((_worker_.id, name, _worker_.err_file))
+    return _worker_.err_file
+
+
+# Checks and inserts one batch on connection taken from pool
+# Returns number of inserted rows, or None if batch failed
+def check_batch(batch, tables):
+    conn = _pool_.getconn()
+    try:
+        cursor = conn.cursor()
+        with _worker_lock_:
+            has_table = id(conn) in tables
+        if not has_table:
+            # Temporary table is committed in its own transaction, so that
+            # rollback of failed batch does not drop it
+            _pool_.create_batch_table(cursor)
+            conn.commit()
+            with _worker_lock_:
+                tables.add(id(conn))
+        missing = find_missing_words(cursor, batch)
+        insert_words_in_db(cursor, missing)
+        conn.commit()
+        cursor.close()
+        return len(missing)
+    except _pool_.Error as e:
+        conn.rollback()
+        err_file = get_worker_err_file()
+        _logger_.error("Worker {}: batch of {} rows failed: {}".format(_worker_.id, len(batch), e))
+        for row in batch:
+            err_file.write("{}\n".format("\t".join(row)).encode('utf-8'))
+        return None
+    finally:
+        _pool_.putconn(conn)
+
+
+# Appends per-worker error files to output file
+def merge_worker_files():
+    for wid, name, err_file in sorted(_worker_files_):
+        err_file.close()
+        with open(name, "rb") as f:
+            shutil.copyfileobj(f, _out_file_)
+        os.remove(name)
+
+
+# Parse input file in batches, checked by parallel workers
+def parse_file_parallel():
+    rows = 0
+    inserted = 0
+    failed = 0
+    batches = 0
+    tables = set()
+    _logger_.info("Started processing input file '{}' in batches of {} lines, {} workers ...".format(
+        _args_.input_file, _args_.batch_size, _args_.workers))
+    start = time.time()
+    with concurrent.futures.ThreadPoolExecutor(_args_.workers) as executor:
+        pending = []
+        for cnt, batch in itertools.chain(read_batches(), [(None, None)]):
+            if batch:
+                pending.append((cnt, len(batch), executor.submit(check_batch, batch, tables)))
+            # Keep only limited number of batches in memory
+            while pending and (len(pending) > 2 * _args_.workers or batch is None):
+                cnt, size, future = pending.pop(0)
+                result = future.result()
+                batches += 1
+                rows += size
+                if result is None:
+                    failed += size
+                else:
+                    inserted += result
+                elapsed = time.time() - start
+                _logger_.info("Batch {}: {} lines read, {} rows checked, {} inserted, {} failed, {:.0f} rows/s".format(
+                    batches, cnt, rows, inserted, failed, rows / elapsed if elapsed > 0 else 0))
+    merge_worker_files()
+    elapsed = time.time() - start
+    _logger_.info("Finished processing input file '{}': {} rows checked, {} inserted, {} failed in {:.1f} s ({:.0f} rows/s).".format(
+        _args_.input_file, rows, inserted, failed, elapsed, rows / elapsed if elapsed > 0 else 0))
+    _logger_.info("Skipped lines and lines of failed batches are in output file.")
+
+
 if __name__ == "__main__":
     init()
     parse_args()
     read_config()
     open_out_file()
     open_database()
-    parse_file()
+    if _args_.workers > 1:
+        parse_file_parallel()
+    elif _args_.bulk:
+        parse_file_bulk()
+    else:
+        parse_file()
     close_out_file()
     close_database()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Database connection pools used by csv2pg.py.
+
+Section [DB] of configuration file selects database driver:
+
+driver   - postgresql (default) or sqlite
+database - database name (PostgreSQL) or database file name (SQLite)
+username - user name (PostgreSQL only)
+
+SQLite is meant as stand-in for PostgreSQL when testing csv2pg.py without
+database server. Queries in configuration file have to use parameter style
+of selected driver (%%s for PostgreSQL, ? for SQLite).
+"""
+
+import io
+import queue
+
+# Temporary table used for checking batches of words
+BATCH_TABLE = 'csv2pg_batch'
+BATCH_COLUMNS = ('wordform', 'lemma', 'msd', 'frequency')
+
+
+class PostgresPool:
+
+    def __init__(self, config, size):
+        import psycopg2
+        import psycopg2.extras
+        import psycopg2.pool
+        self.Error = psycopg2.Error
+        self._extras = psycopg2.extras
+        self._pool = psycopg2.pool.ThreadedConnectionPool(1, size, "dbname={} user={}".format(
+            config['database'], config['username']))
+
+    def getconn(self):
+        return self._pool.getconn()
+
+    def putconn(self, conn):
+        self._pool.putconn(conn)
+
+    def closeall(self):
+        self._pool.closeall()
+
+    def create_batch_table(self, cursor):
+        cursor.execute("CREATE TEMPORARY TABLE {} ({} text)".format(BATCH_TABLE, " text, ".join(BATCH_COLUMNS)))
+
+    # Replaces content of temporary table with batch, using COPY
+    def load_batch(self, cursor, batch):
+        buf = io.StringIO()
+        for row in batch:
+            buf.write("\t".join(x.replace('\\', '\\\\') for x in row))
+            buf.write("\n")
+        buf.seek(0)
+        cursor.execute("TRUNCATE {}".format(BATCH_TABLE))
+        cursor.copy_from(buf, BATCH_TABLE, columns=BATCH_COLUMNS)
+
+    # Query has to contain "VALUES %s", see psycopg2.extras.execute_values
+    def insert_rows(self, cursor, query, rows, page_size):
+        self._extras.execute_values(cursor, query, rows, page_size=page_size)
+
+
+class SqlitePool:
+
+    def __init__(self, config, size):
+        import sqlite3
+        self.Error = sqlite3.Error
+        self._sqlite3 = sqlite3
+        self._database = config['database']
+        self._free = queue.LifoQueue()
+
+    def getconn(self):
+        try:
+            return self._free.get_nowait()
+        except queue.Empty:
+            return self._sqlite3.connect(self._database, timeout=60, check_same_thread=False)
+
+    def putconn(self, conn):
+        self._free.put(conn)
+
+    def closeall(self):
+        while not self._free.empty():
+            self._free.get_nowait().close()
+
+    def create_batch_table(self, cursor):
+        cursor.execute("CREATE TEMPORARY TABLE {} ({} text)".format(BATCH_TABLE, " text, ".join(BATCH_COLUMNS)))
+
+    # Write lock is taken at start of transaction, otherwise parallel workers
+    # would fail with "database is locked" when upgrading their read locks
+    def load_batch(self, cursor, batch):
+        if not cursor.connection.in_transaction:
+            cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("DELETE FROM {}".format(BATCH_TABLE))
+        cursor.executemany("INSERT INTO {} VALUES ({})".format(
+            BATCH_TABLE, ", ".join("?" * len(BATCH_COLUMNS))), batch)
+
+    # Query has to contain one "?" for each column
+    def insert_rows(self, cursor, query, rows, page_size):
+        cursor.executemany(query, rows)
+
+
+DRIVERS = {
+    'postgresql' : PostgresPool,
+    'sqlite'     : SqlitePool
+}
+
+
+# Opens pool of at most "size" connections, driver is chosen by configuration
+def open_pool(config, size):
+    driver = config.get('driver', 'postgresql')
+    if driver not in DRIVERS:
+        raise ValueError("Unknown database driver '{}'".format(driver))
+    return DRIVERS[ driver ](config, size)
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+External merge sort of text lines with bounded memory, used to write
+per-letter files of lex2pos.py and wic2pos.py sorted and without duplicates
+(option --sort), so that word corpus made from them needs less sorting.
+
+Lines are read in runs of run_size lines. Each run is sorted in memory and,
+unless it is the last one, written to temporary file in tmp_dir. Runs are
+then merged with heapq.merge, dropping duplicate lines if asked.
+
+Lines are compared as Python strings, which is the same order as bytes
+of UTF-8 encoded lines, i.e. order of "LC_ALL=C sort". Order of sort in
+other locale is got with key=locale.strxfrm. Sorted files can be merged
+into one with merge_files() (used by tag2corp.py). Lines made one by one
+while other lines are being sorted are sorted with RunWriter.
+"""
+
+import heapq
+import itertools
+import multiprocessing
+import os
+import tempfile
+
+# Number of lines sorted in memory at once
+RUN_SIZE = 1000000
+
+
+# Yields lines of iterable sorted, without duplicates if unique is set
+# Lines must end with end of line. With key (i.e. locale.strxfrm) lines
+# are compared by key, also when looking for duplicates.
+def sorted_lines(lines, run_size=RUN_SIZE, tmp_dir=None, unique=True, key=None):
+    lines = iter(lines)
+    runs = []
+    try:
+        while True:
+            run = list(itertools.islice(lines, run_size))
+            run.sort(key=key)
+            if len(run) < run_size:
+                break
+            runs.append(_write_run(run, tmp_dir))
+        # Last run is merged from memory
+        merged = heapq.merge(*runs, run, key=key)
+        yield from _unique(merged, key) if unique else merged
+    finally:
+        for f in runs:
+            f.close()
+
+
+# Drops lines equal to previous line (or having equal key)
+def _unique(lines, key):
+    prev = None
+    for line in lines:
+        cur = line if key is None else key(line)
+        if cur != prev:
+            prev = cur
+            yield line
+
+
+def _write_run(run, tmp_dir):
+    f = tempfile.TemporaryFile('w+', encoding='utf-8', newline='', dir=tmp_dir)
+    f.writelines(run)
+    f.seek(0)
+    return f
+
+
+# Sorts lines added one by one, like sorted_lines, for lines made while
+# other iterable is being sorted. Lines are kept in memory only up to
+# run_size, full runs are sorted and written to temporary files.
+class RunWriter:
+
+    def __init__(self, run_size=RUN_SIZE, tmp_dir=None, key=None):
+        self._run_size = run_size
+        self._tmp_dir = tmp_dir
+        self._key = key
+        self._run = []
+        self._runs = []
+
+    def add(self, line):
+        self._run.append(line)
+        if len(self._run) >= self._run_size:
+            self._run.sort(key=self._key)
+            self._runs.append(_write_run(self._run, self._tmp_dir))
+            self._run = []
+
+    # Writes all added lines to file sorted, returns number of lines written
+    def write(self, path, unique=True):
+        cnt = 0
+        self._run.sort(key=self._key)
+        for f in self._runs:
+            f.seek(0)
+        with open(path, 'w', encoding='utf-8', newline='') as outfile:
+            merged = heapq.merge(*self._runs, self._run, key=self._key)
+            for line in _unique(merged, self._key) if unique else merged:
+                outfile.write(line)
+                cnt += 1
+        return cnt
+
+    # Removes temporary files of runs
+    def close(self):
+        for f in self._runs:
+            f.close()
+        self._runs = []
+        self._run = []
+
+
+# Sorts file in place, returns number of lines written
+def sort_file(path, run_size=RUN_SIZE, tmp_dir=None, unique=True):
+    cnt = 0
+    out_path = path + '.sorted'
+    with open(path, encoding='utf-8', newline='') as infile, \
+         open(out_path, 'w', encoding='utf-8', newline='') as outfile:
+        lines = (line if line.endswith('\n') else line + '\n' for line in infile)
+        for line in sorted_lines(lines, run_size, tmp_dir, unique):
+            outfile.write(line)
+            cnt += 1
+    os.replace(out_path, path)
+    return cnt
+
+
+# Writes lines to file sorted, returns number of lines written
+def write_sorted(lines, path, run_size=RUN_SIZE, tmp_dir=None, unique=True, key=None):
+    cnt = 0
+    with open(path, 'w', encoding='utf-8', newline='') as outfile:
+        for line in sorted_lines(lines, run_size, tmp_dir, unique, key):
+            outfile.write(line)
+            cnt += 1
+    return cnt
+
+
+# Merges sorted files into one, returns number of lines written
+# Files must be sorted with the same key, lines of the first file come
+# first among equal lines
+def merge_files(paths, out_path, unique=True, key=None):
+    cnt = 0
+    infiles = [ open(path, encoding='utf-8', newline='') for path in paths ]
+    try:
+        with open(out_path, 'w', encoding='utf-8', newline='') as outfile:
+            merged = heapq.merge(*infiles, key=key)
+            for line in _unique(merged, key) if unique else merged:
+                outfile.write(line)
+                cnt += 1
+    finally:
+        for f in infiles:
+            f.close()
+    return cnt
+
+
+# Sorts files in place, "jobs" files at the same time
+# Returns number of lines written
+def sort_files(paths, run_size=RUN_SIZE, tmp_dir=None, unique=True, jobs=1):
+    tasks = [ (path, run_size, tmp_dir, unique) for path in paths ]
+    if jobs <= 1:
+        return sum(sort_file(*task) for task in tasks)
+    with multiprocessing.Pool(jobs) as pool:
+        return sum(pool.starmap(sort_file, tasks))
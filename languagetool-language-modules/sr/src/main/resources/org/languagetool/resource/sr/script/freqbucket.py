@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Maps word frequencies to wordlist "f" values (1 to 255 by default).
+
+Mapping is described with sorted list of bucket boundaries: frequency goes
+to bucket 1 + number of boundaries not greater than frequency. Whole chunks
+of frequencies are mapped with one numpy.searchsorted call when NumPy is
+installed, otherwise bisect is used for each frequency.
+
+Distributions:
+    equal    - each bucket holds equal number of distinct frequencies (default)
+    log      - buckets have equal width on logarithmic scale
+    quantile - each bucket holds equal number of words (rows in corpus)
+"""
+
+import bisect
+import math
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+DISTRIBUTIONS = ('equal', 'log', 'quantile')
+
+
+class FrequencyBuckets:
+
+    # Param freqs: ascending list of distinct frequencies
+    # Param buckets: number of buckets
+    # Param distribution: one of DISTRIBUTIONS
+    # Param counts: number of occurrences of each frequency, needed for "quantile"
+    # Param zero_bucket: frequency 0 goes to bucket 0 and the first
+    #   (lowest, assumed zero) frequency is left out of distribution
+    def __init__(self, freqs, buckets=255, distribution='equal', counts=None, zero_bucket=False):
+        if distribution not in DISTRIBUTIONS:
+            raise ValueError("Unknown frequency distribution '{}'".format(distribution))
+        if distribution == 'quantile' and counts is None:
+            raise ValueError("Quantile frequency distribution needs frequency counts")
+        self.freqs = freqs
+        self.buckets = buckets
+        self.zero_bucket = zero_bucket
+        start = 1 if zero_bucket else 0
+        if distribution == 'equal':
+            self.boundaries = self._equal_boundaries(freqs[start:])
+        elif distribution == 'log':
+            self.boundaries = self._log_boundaries(freqs[start:])
+        else:
+            self.boundaries = self._quantile_boundaries(freqs[start:], counts)
+        if numpy is not None:
+            self._np_boundaries = numpy.array(self.boundaries, dtype=numpy.float64)
+
+    # Bucket size is the same as in original nested msb/lsb loops
+    def _equal_boundaries(self, values):
+        bucket_size = len(values) // self.buckets + 1
+        return [ values[ ind ] for ind in range(bucket_size, len(values), bucket_size) ]
+
+    def _log_boundaries(self, values):
+        if len(values) < 2:
+            return []
+        low, span = values[0], math.log1p(values[-1] - values[0])
+        return [ low - 1 + math.exp(span * k / self.buckets) for k in range(1, self.buckets) ]
+
+    def _quantile_boundaries(self, values, counts):
+        cumulative = []
+        total = 0
+        for value in values:
+            cumulative.append(total)
+            total += counts[ value ]
+        boundaries = []
+        for k in range(1, self.buckets):
+            ind = bisect.bisect_left(cumulative, total * k / self.buckets)
+            if ind < len(values):
+                boundaries.append(values[ ind ])
+        return boundaries
+
+    # Maps single frequency
+    def get(self, frequency):
+        if self.zero_bucket and frequency == 0:
+            return 0
+        return bisect.bisect_right(self.boundaries, frequency) + 1
+
+    # Maps list (or NumPy array) of frequencies, returning list of buckets
+    def map_chunk(self, frequencies):
+        if numpy is None:
+            return [ self.get(frequency) for frequency in frequencies ]
+        frequencies = numpy.asarray(frequencies)
+        ret = numpy.searchsorted(self._np_boundaries, frequencies, side='right') + 1
+        if self.zero_bucket:
+            ret[ frequencies == 0 ] = 0
+        return ret.tolist()
+
+    # Returns dictionary frequency => bucket for all distinct frequencies
+    def as_dict(self):
+        ret = dict(zip(self.freqs, self.map_chunk(self.freqs)))
+        if self.zero_bucket:
+            ret[ 0 ] = 0
+        return ret
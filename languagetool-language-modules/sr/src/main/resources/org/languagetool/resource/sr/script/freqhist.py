@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Collects distinct word frequencies from Serbian word corpus.
+Used by lex2pos.py and makewordlist.py when making frequency map.
+
+Values are gathered in chunks. Each full chunk is reduced with numpy.unique
+when NumPy is installed, otherwise it is counted directly into a hash map
+(frequency -> number of occurrences).
+"""
+
+import collections
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+CHUNK_SIZE = 1 << 16
+
+
+class FrequencyHistogram:
+
+    def __init__(self, chunk_size=CHUNK_SIZE, use_numpy=True):
+        self._values = collections.Counter()
+        self._chunk = list()
+        self._chunk_size = chunk_size
+        self._numpy = numpy if use_numpy else None
+
+    # Adds single frequency
+    def add(self, frequency):
+        self._chunk.append(frequency)
+        if len(self._chunk) >= self._chunk_size:
+            self._flush()
+
+    # Adds any iterable (or NumPy array) of frequencies
+    def add_chunk(self, frequencies):
+        self._flush()
+        if self._numpy is not None:
+            self._update_unique(self._numpy.asarray(frequencies, dtype=self._numpy.int64))
+        else:
+            self._values.update(frequencies)
+
+    # Adds counts (frequency => number of occurrences) from other histogram
+    def merge(self, counts):
+        self._flush()
+        self._values.update(counts)
+
+    def _flush(self):
+        if not self._chunk:
+            return
+        chunk, self._chunk = self._chunk, list()
+        if self._numpy is not None and len(chunk) > 1024:
+            self._update_unique(self._numpy.array(chunk, dtype=self._numpy.int64))
+        else:
+            self._values.update(chunk)
+
+    def _update_unique(self, array):
+        values, counts = self._numpy.unique(array, return_counts=True)
+        for value, count in zip(values.tolist(), counts.tolist()):
+            self._values[ value ] += count
+
+    # Number of distinct frequencies
+    def __len__(self):
+        self._flush()
+        return len(self._values)
+
+    def __contains__(self, frequency):
+        self._flush()
+        return frequency in self._values
+
+    def min(self):
+        self._flush()
+        return min(self._values)
+
+    def max(self):
+        self._flush()
+        return max(self._values)
+
+    # Returns list of distinct frequencies, in ascending order
+    def sorted(self):
+        self._flush()
+        return sorted(self._values)
+
+    # Returns number of occurrences for each of distinct frequencies
+    def counts(self):
+        self._flush()
+        return self._values
+
+
+# Old way of collecting frequencies, kept for benchmark only
+def _collect_list(frequencies):
+    freq = list()
+    for frequency in frequencies:
+        if frequency not in freq:
+            freq.append(frequency)
+    return sorted(freq)
+
+
+def _collect_histogram(frequencies, use_numpy):
+    hist = FrequencyHistogram(use_numpy=use_numpy)
+    for frequency in frequencies:
+        hist.add(frequency)
+    return hist.sorted()
+
+
+# Compares list and histogram collection on synthetic corpus
+# with Zipf-like distribution of word frequencies
+def _benchmark(lines, seed):
+    import random
+    import time
+    rnd = random.Random(seed)
+    frequencies = [int(rnd.paretovariate(0.8)) for _ in range(lines)]
+    print("Synthetic corpus: {} lines, {} different frequencies".format(lines, len(set(frequencies))))
+    methods = [('histogram (set)', lambda: _collect_histogram(frequencies, False))]
+    if numpy is not None:
+        methods.append(('histogram (numpy)', lambda: _collect_histogram(frequencies, True)))
+    methods.append(('list', lambda: _collect_list(frequencies)))
+    expected = None
+    for name, method in methods:
+        start = time.perf_counter()
+        result = method()
+        elapsed = time.perf_counter() - start
+        if expected is None:
+            expected = result
+        elif result != expected:
+            print("ERROR: Method '{}' returned different result".format(name))
+        print("{:<20} {:>10.3f} s".format(name, elapsed))
+
+
+# Run benchmark by running this module directly
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmarks collecting of distinct word frequencies.')
+    parser.add_argument('-n', '--lines', default=10000000, type=int)
+    parser.add_argument('-s', '--seed',  default=1, type=int)
+    args = parser.parse_args()
+    _benchmark(args.lines, args.seed)
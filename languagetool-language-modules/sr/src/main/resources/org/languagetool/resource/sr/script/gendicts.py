@@ -0,0 +1,419 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Program builds Serbian POS dictionary, SYNTH dictionary and Hunspell
+# dictionary from Serbian word corpus, like all steps before gendicts.sh and
+# gendicts.sh itself, rebuilding only what has changed since the last run.
+
+import argparse
+import collections
+import concurrent.futures
+import glob
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import extsort
+import tag2corp
+
+"""
+Build is a graph of stages. Each stage has input files, output files and a
+recipe (command line or description of work done in this program). Stage
+depends on stages which make its input files:
+
+    split       - lex2pos.py/wic2pos.py: input file => per-letter word files
+    tag-*       - pos2lt.py for each per-letter word file (as in tag2corp.sh)
+    corpus      - sorted, unique word corpus and word corpus for Hunspell
+    frequencies - makewordlist.py on per-letter word files: wordlist file
+    pos-dict    - ltposdic:  serbian.dict
+    synth-dict  - ltsyndic:  serbian_synth.dict
+    hunspell    - ltspldic:  serbian_hunspell.dict
+
+Stage is built only if SHA-256 hash of its recipe and contents of its
+input files differs from the one of its last build, or its output files have
+changed since then. Hashes are kept in state file, together with hashes of
+files by size and modification time, so unchanged big files are not read
+again. If per-letter word files stay the same, nothing after split is built
+again, and if only some of them change, only those are tagged again.
+
+Stages whose inputs are ready run at the same time, up to "-j" stages,
+so i.e. ltposdic, ltsyndic and ltspldic run together. Output of commands is
+written to log directory, one file per stage. At the end, table with time
+and status of each stage is written:
+
+    built   - stage was built
+    skipped - stage was up to date
+    failed  - stage failed, see its log file
+    blocked - stage was not built, because some stage before it failed
+"""
+
+_args_, _logger_ = None, None
+LOG_FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+
+DIALECTS = {
+    'e' : 'ekavian',
+    'i' : 'jekavian'
+}
+
+# Temporary files left by dictionary builders, see gendicts.sh
+BUILDER_TEMP_FILES = ('DictionaryBuilder*txt', 'DictionaryBuilder*info',
+                      'SynthDictionaryBuilder*txt', 'SynthDictionaryBuilder*info',
+                      'SpellDictionaryBuilder*txt', 'SpellDictionaryBuilder*info')
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+# Matches module names in import statements
+IMPORT_REGEX = re.compile(r'^\s*(?:import|from)\s+(\w+)', re.MULTILINE)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Builds Serbian dictionaries, only stages with changed inputs.')
+    parser.add_argument('dialect', choices=sorted(DIALECTS))
+    parser.add_argument('-b', '--base-dir',   default='/opt/app/s/smd')
+    parser.add_argument('-d', '--debug',      action ='store_true', default=False)
+    parser.add_argument('--dict-dir', default=os.path.join(SCRIPT_DIR, '..', 'dictionary'))
+    parser.add_argument('-f', '--force',      action ='store_true', default=False, help='build all stages')
+    parser.add_argument('-i', '--input-file', default=None)
+    parser.add_argument('-j', '--jobs',       default=os.cpu_count() or 1, type=int)
+    parser.add_argument('-m', '--map-file', default=None)
+    parser.add_argument('-r', '--regex',      default='lex', choices=('lex', 'wic'))
+    parser.add_argument('--sort-run-size', default=extsort.RUN_SIZE, type=int, help='lines sorted in memory at once')
+    parser.add_argument('-s', '--state-file', default=None, help='build state, <base dir>/gendicts-<dialect>.json by default')
+    parser.add_argument('-t', '--tmp-dir', default=tempfile.gettempdir())
+    global _args_
+    _args_ = parser.parse_args()
+    init_logger()
+    _logger_.debug( "Command-line arguments: {}".format(_args_) )
+    if not _args_.input_file:
+        _logger_.error("Input file (-i) was not specified, aborting ...")
+        sys.exit(1)
+    if not _args_.map_file:
+        _logger_.error("Map file (-m) was not specified, aborting ...")
+        sys.exit(1)
+    _args_.input_file = os.path.abspath(_args_.input_file)
+    _args_.map_file = os.path.abspath(_args_.map_file)
+    _args_.base_dir = os.path.abspath(_args_.base_dir)
+    _args_.dict_dir = os.path.abspath(_args_.dict_dir)
+    if not _args_.state_file:
+        _args_.state_file = os.path.join(_args_.base_dir, "gendicts-{}.json".format(DIALECTS[ _args_.dialect ]))
+
+
+def init_logger():
+    global _logger_
+    logging.basicConfig(format=LOG_FORMAT)
+    _logger_ = logging.getLogger("gendicts")
+    if _args_.debug:
+        _logger_.setLevel( logging.DEBUG )
+    else:
+        _logger_.setLevel( logging.INFO )
+
+
+# Raised when stage can not be built
+class BuildError(Exception):
+    pass
+
+
+class Stage:
+
+    # Param recipe: list of strings, which changes output if changed (i.e. command line)
+    # Param action: function building stage, called with stage as argument
+    def __init__(self, name, inputs, outputs, recipe, action):
+        self.name = name
+        self.inputs = list(inputs)
+        self.outputs = list(outputs)
+        self.recipe = list(recipe)
+        self.action = action
+        self.log_file = os.path.join(_args_.base_dir, 'log', name + '.log')
+
+
+# Returns SHA-256 hash of file content
+# Hashes are cached by path, size and modification time of file
+def file_hash(path, cache):
+    st = os.stat(path)
+    cached = cache.get(path)
+    if cached is not None and cached[0] == st.st_size and cached[1] == st.st_mtime_ns:
+        return cached[2]
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    cache[ path ] = [ st.st_size, st.st_mtime_ns, digest.hexdigest() ]
+    return cache[ path ][2]
+
+
+# Returns hash of stage recipe and contents of its input files
+def stage_hash(stage, cache):
+    digest = hashlib.sha256()
+    for item in stage.recipe:
+        digest.update(item.encode('utf-8') + b'\0')
+    for path in stage.inputs:
+        digest.update("{}\0{}\0".format(path, file_hash(path, cache)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+# Returns action running command, its output goes to log file of stage
+def command(args):
+    def run_command(stage):
+        os.makedirs(os.path.dirname(stage.log_file), exist_ok=True)
+        with open(stage.log_file, 'wb') as log:
+            ret = subprocess.call(args, stdout=log, stderr=subprocess.STDOUT, cwd=_args_.base_dir)
+        if ret != 0:
+            raise BuildError("{} exited with {}, see {}".format(args[0], ret, stage.log_file))
+    return run_command
+
+
+# Returns action tagging per-letter word file with pos2lt.py
+# Empty file is not tagged (like in tag2corp.sh), tagged file is left empty
+def tag_command(args):
+    run_command = command(args)
+    def tag(stage):
+        if os.path.getsize(stage.inputs[0]) == 0:
+            open(stage.outputs[0], 'wb').close()
+        else:
+            run_command(stage)
+    return tag
+
+
+# Yields lines of files, one after another
+def read_lines(paths):
+    for path in paths:
+        with open(path, encoding='utf-8', newline='') as f:
+            yield from f
+
+
+# Returns action making sorted unique word corpus and word corpus for Hunspell
+# of tagged files, the same as "sort -u" in tag2corp.sh
+def corpus_action(tagged):
+    def make_corpus(stage):
+        corpus_file, hunspell_file = stage.outputs
+        key = tag2corp.get_sort_key()
+        cnt = extsort.write_sorted(read_lines(tagged), corpus_file, _args_.sort_run_size, _args_.tmp_dir, key=key)
+        _logger_.info("Serbian word corpus is ready in file '{}' ({} lines).".format(corpus_file, cnt))
+        forms = (line.rstrip('\n').split('\t', 1)[0] + '\n' for line in read_lines(tagged))
+        cnt = extsort.write_sorted(forms, hunspell_file, _args_.sort_run_size, _args_.tmp_dir, key=key)
+        _logger_.info("Serbian word corpus for Hunspell is ready in file '{}' ({} lines).".format(hunspell_file, cnt))
+    return make_corpus
+
+
+# Returns action running makewordlist.py on per-letter word files,
+# concatenated into words_file
+def wordlist_command(args, word_files, words_file):
+    run_command = command(args)
+    def make_wordlist(stage):
+        try:
+            with open(words_file, 'wb') as out:
+                for path in word_files:
+                    with open(path, 'rb') as f:
+                        shutil.copyfileobj(f, out)
+            run_command(stage)
+        finally:
+            os.remove(words_file)
+    return make_wordlist
+
+
+# Returns sorted paths of script and of all modules from SCRIPT_DIR
+# it imports, directly or through other such modules, so that stage
+# is built again when any code it runs changes
+def local_modules(script_path):
+    found = set()
+    pending = [ script_path ]
+    while pending:
+        path = pending.pop()
+        if path in found:
+            continue
+        found.add(path)
+        if not os.path.isfile(path):
+            continue
+        with open(path, encoding='utf-8') as f:
+            for module in IMPORT_REGEX.findall(f.read()):
+                module_path = os.path.join(SCRIPT_DIR, module + '.py')
+                if os.path.isfile(module_path):
+                    pending.append(module_path)
+    return sorted(found)
+
+
+# Returns path of MSD => LT tag table of srptagging.py
+def srptagging_table():
+    return os.path.join(SCRIPT_DIR, 'srptagging-table.txt')
+
+
+# Returns list of stages of build
+def make_stages():
+    diadesc = DIALECTS[ _args_.dialect ]
+    pos_dir = os.path.join(_args_.base_dir, 'pos')
+    lt_dir = os.path.join(_args_.base_dir, 'lt')
+    dict_path = os.path.join(_args_.dict_dir, diadesc)
+    python = sys.executable
+    stages = []
+
+    def script(name):
+        return os.path.join(SCRIPT_DIR, name)
+
+    split_script = script(_args_.regex + '2pos.py')
+    split_inputs = local_modules(split_script)
+    word_files = [ os.path.join(pos_dir, lett, "{}-{}-{}.txt".format(lett, _args_.regex, fext))
+                   for lett in tag2corp.LETTERS for fext in tag2corp.FILE_TYPES ]
+    args = [ python, split_script, '-i', _args_.input_file, '-m', _args_.map_file, '-r', _args_.regex, '-b', pos_dir ]
+    # Number of jobs does not change output, so it is not part of recipe
+    stages.append(Stage('split', [ _args_.input_file, _args_.map_file ] + split_inputs, word_files, args,
+                        command(args + [ '-j', str(_args_.jobs) ])))
+
+    tag_inputs = local_modules(script('pos2lt.py'))
+    # MSD => LT tag table is optional, srptagging.py uses it when it exists
+    if os.path.isfile(srptagging_table()):
+        tag_inputs.append(srptagging_table())
+    tagged_files = []
+    for path in word_files:
+        tagged = os.path.join(lt_dir, os.path.basename(path))
+        tagged_files.append(tagged)
+        args = [ python, script('pos2lt.py'), '-i', path, '-o', lt_dir ]
+        stages.append(Stage('tag-' + os.path.basename(path)[ :-4 ], [ path ] + tag_inputs, [ tagged ], args,
+                            tag_command(args)))
+
+    corpus_file = os.path.join(lt_dir, "synth-serbian-{}-corpus.txt".format(diadesc))
+    hunspell_file = os.path.join(lt_dir, "hunspell-serbian-{}-corpus.txt".format(diadesc))
+    stages.append(Stage('corpus', tagged_files + local_modules(script('extsort.py')), [ corpus_file, hunspell_file ],
+                        [ 'sort -u', os.environ.get('LC_ALL', ''), os.environ.get('LC_COLLATE', ''), os.environ.get('LANG', '') ],
+                        corpus_action(tagged_files)))
+
+    freq_file = os.path.join(lt_dir, "serbian-{}-wordlist.xml".format(diadesc))
+    words_file = os.path.join(lt_dir, "serbian-{}-words.tmp".format(diadesc))
+    args = [ python, script('makewordlist.py'), '-i', words_file, '-o', freq_file ]
+    stages.append(Stage('frequencies', word_files + local_modules(script('makewordlist.py')), [ freq_file ], args,
+                        wordlist_command(args, word_files, words_file)))
+
+    info = os.path.join(_args_.dict_dir, 'serbian.info')
+    synth_info = os.path.join(_args_.dict_dir, 'serbian_synth.info')
+    builders = (
+        ('pos-dict', [ 'ltposdic', '-i', corpus_file, '-info', info, '-freq', freq_file,
+                       '-o', os.path.join(dict_path, 'serbian.dict') ]),
+        ('synth-dict', [ 'ltsyndic', '-i', corpus_file, '-info', synth_info,
+                         '-o', os.path.join(dict_path, 'serbian_synth.dict') ]),
+        ('hunspell', [ 'ltspldic', '-i', hunspell_file, '-info', info, '-freq', freq_file,
+                       '-o', os.path.join(dict_path, 'serbian_hunspell.dict') ])
+    )
+    for name, args in builders:
+        inputs = [ args[ ind + 1 ] for ind, arg in enumerate(args) if arg in ('-i', '-info', '-freq') ]
+        stages.append(Stage(name, inputs, [ args[-1] ], args, command(args)))
+    return stages
+
+
+def load_state():
+    if os.path.exists(_args_.state_file):
+        with open(_args_.state_file) as f:
+            return json.load(f)
+    return dict(stages=dict(), files=dict())
+
+
+def save_state(state):
+    tmp_file = _args_.state_file + '.tmp'
+    with open(tmp_file, 'w') as f:
+        json.dump(state, f, indent=1, sort_keys=True)
+    os.replace(tmp_file, _args_.state_file)
+
+
+# Builds stage if needed, returns status and hash of stage
+def run_stage(stage, state):
+    missing = [ path for path in stage.inputs if not os.path.isfile(path) ]
+    if missing:
+        raise BuildError("Input files do not exist: {}".format(missing))
+    key = stage_hash(stage, state[ 'files' ])
+    last = state[ 'stages' ].get(stage.name)
+    if not _args_.force and last is not None and last[ 'hash' ] == key \
+       and all(os.path.isfile(path) and file_hash(path, state[ 'files' ]) == last[ 'outputs' ].get(path)
+               for path in stage.outputs):
+        return 'skipped', key
+    _logger_.info("Building stage {} ...".format(stage.name))
+    for path in stage.outputs:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    stage.action(stage)
+    missing = [ path for path in stage.outputs if not os.path.isfile(path) ]
+    if missing:
+        raise BuildError("Output files were not made: {}".format(missing))
+    return 'built', key
+
+
+# Runs stage, returns status, elapsed time and hash of stage
+def timed_stage(stage, state):
+    start = time.perf_counter()
+    try:
+        status, key = run_stage(stage, state)
+    except (BuildError, OSError) as e:
+        _logger_.error("Stage {} failed: {}".format(stage.name, e))
+        status, key = 'failed', None
+    return status, time.perf_counter() - start, key
+
+
+# Builds all stages, "-j" stages at the same time
+# Hashes of built stages are put in state, which is saved by caller
+# Returns dictionary stage name => (status, elapsed time)
+def build(stages, state):
+    producers = dict((path, stage.name) for stage in stages for path in stage.outputs)
+    deps = dict((stage.name, set(producers[ path ] for path in stage.inputs if path in producers)) for stage in stages)
+    results = dict()
+    pending = list(stages)
+    running = dict()
+    with concurrent.futures.ThreadPoolExecutor(max(_args_.jobs, 1)) as pool:
+        while pending or running:
+            # Start stages whose dependencies are built, block stages after failed ones
+            for stage in list(pending):
+                statuses = [ results[ dep ][0] if dep in results else None for dep in deps[ stage.name ] ]
+                if any(status in ('failed', 'blocked') for status in statuses):
+                    results[ stage.name ] = ('blocked', 0.0)
+                    pending.remove(stage)
+                elif None not in statuses:
+                    running[ pool.submit(timed_stage, stage, state) ] = stage
+                    pending.remove(stage)
+            if not running:
+                continue
+            done, _ = concurrent.futures.wait(running, return_when=concurrent.futures.FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                status, elapsed, key = future.result()
+                results[ stage.name ] = (status, elapsed)
+                if status == 'built':
+                    outputs = dict((path, file_hash(path, state[ 'files' ])) for path in stage.outputs)
+                    state[ 'stages' ][ stage.name ] = dict(hash=key, outputs=outputs)
+                elif status == 'failed':
+                    state[ 'stages' ].pop(stage.name, None)
+    return results
+
+
+# Removes temporary files left by dictionary builders
+def rm_temp_files():
+    for pattern in BUILDER_TEMP_FILES:
+        for path in glob.glob(os.path.join(_args_.tmp_dir, pattern)):
+            os.remove(path)
+
+
+# Logs time and status of each stage
+def report(stages, results, elapsed):
+    _logger_.info("{:<24} {:<8} {:>10}".format('Stage', 'Status', 'Time'))
+    for stage in stages:
+        status, stage_elapsed = results.get(stage.name, ('blocked', 0.0))
+        _logger_.info("{:<24} {:<8} {:>8.3f} s".format(stage.name, status, stage_elapsed))
+    counts = collections.Counter(status for status, _ in results.values())
+    _logger_.info("{:<24} {:<8} {:>8.3f} s".format('total', '', elapsed))
+    _logger_.info("Stages: {}.".format(", ".join("{} {}".format(cnt, status) for status, cnt in sorted(counts.items()))))
+
+
+if __name__ == "__main__":
+    parse_args()
+    os.makedirs(_args_.base_dir, exist_ok=True)
+    stages = make_stages()
+    state = load_state()
+    start = time.perf_counter()
+    try:
+        results = build(stages, state)
+    finally:
+        save_state(state)
+        rm_temp_files()
+    report(stages, results, time.perf_counter() - start)
+    if any(status in ('failed', 'blocked') for status, _ in results.values()):
+        sys.exit(1)
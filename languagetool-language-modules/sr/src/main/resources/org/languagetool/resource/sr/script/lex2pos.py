@@ -11,9 +11,20 @@
 
 import argparse
 import logging
-import re
+import multiprocessing
 import os
+import shutil
 import sys
+import tempfile
+
+import corpus
+import extsort
+import freqbucket
+import freqhist
+import quarantine
+import router
+import shard
+import translit
 
 """
 Program reads morphologic dictionary from a single file, line by line, splitting entries into
@@ -24,8 +35,9 @@ If lemma == "apple", then whole line goes to file "a-words.txt" etc.
 If entries are in Croatian Latin script, they will be converted into Serbian Cyrillic script.
 """
 
-_args_, _logger_, _l2comp_, _l2conv_, _ciregex_, _freqs_, _cirdict_ = None, None, None, None, None, list(), None
-_freqmap_ = dict()
+_args_, _logger_, _translit_, _freqs_, _cirdict_ = None, None, None, list(), None
+_freqmap_, _freqcnt_ = dict(), dict()
+_quarantine_ = None
 
 LOG_FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
 CYR_LETTERS = {
@@ -69,10 +81,16 @@ REGEX_TYPE = {
     "lex" : "^([!\"\'\(\),\-\.:;\?]|[a-zčćžšđâîôûﬂǌüöäø’A-ZČĆŽŠĐ0-9_\-]+)\s+([!\"\'\(\),\-\.:;\?]|[a-zčćžšđâîôûﬂǌüöäø’A-ZČĆŽŠĐ0-9_\-]+)\s+([a-zA-Z0-9\-]+)\s+(\d+)*"
 }
 
-BAD_GROUPS = ('ü', 'ö', 'ä', 'ø', 'аа', 'ии', 'уу', 'цх', 'тз', 'цз', 'q', 'w', 'x', 'y', 'Q', 'W', 'X', 'Y', 'Ä', 'Ü', 'Ö', 'è', 'à', 'фф', 'бб', 'зз', 'лл', 'мм', 'нн', 'пп', 'рр', 'сс', 'тт', 'гх', 'тх', 'хх')
+# Groups of letters, which put word into "bad" file, by reason code
+BAD_GROUPS = {
+    'foreign-letter'   : ('ü', 'ö', 'ä', 'ø', 'q', 'w', 'x', 'y', 'Q', 'W', 'X', 'Y', 'Ä', 'Ü', 'Ö', 'è', 'à'),
+    'double-vowel'     : ('аа', 'ии', 'уу'),
+    'double-consonant' : ('фф', 'бб', 'зз', 'лл', 'мм', 'нн', 'пп', 'рр', 'сс', 'тт', 'хх'),
+    'foreign-cluster'  : ('цх', 'тз', 'цз', 'гх', 'тх')
+}
 
-# Map holding transliterated Cyrillic letters pointing to
-# descriptors of opened files
+# Router holding transliterated Cyrillic letters pointing to
+# output files
 WORD_FILES = {}
 
 # List (or better: tupple) of Latin letters and ligatures
@@ -84,19 +102,22 @@ CIR_UTF_LIST = (u"Ђ", u"Џ", u"Џ", u"Љ", u"Љ", u"Њ", u"Њ", u"А", u"Б", u
 def parse_args():
     parser = argparse.ArgumentParser(description='Processes file containing Serbian word corpus.')
     parser.add_argument('-b', '--base-dir',   default='/tmp')
+    parser.add_argument('--buffer-size', default=router.BUFFER_SIZE, type=int, help='lines buffered for each output file')
     parser.add_argument('-d', '--debug',      action ='store_true', default=False)
+    parser.add_argument('-f', '--freq-distribution', default='equal', choices=freqbucket.DISTRIBUTIONS)
     parser.add_argument('-i', '--input-file', default=None)
+    parser.add_argument('-j', '--jobs',       default=1, type=int)
+    parser.add_argument('--max-open-files', default=router.MAX_OPEN, type=int)
     parser.add_argument('-m', '--map-file', default=None)
     parser.add_argument('-n', '--first-n-lines', default=0, type=int)
     parser.add_argument('-r', '--regex',      default=None)
-    global _args_, _logger_
+    parser.add_argument('--sort', action ='store_true', default=False, help='sort word files, removing duplicate lines')
+    parser.add_argument('--sort-run-size', default=extsort.RUN_SIZE, type=int, help='lines sorted in memory at once')
+    parser.add_argument('-t', '--tmp-dir', default=None, help='directory for temporary files, base directory by default')
+    parser.add_argument('-s', '--single-pass', action ='store_true', default=False)
+    global _args_
     _args_ = parser.parse_args()
-    logging.basicConfig(format=LOG_FORMAT)
-    _logger_ = logging.getLogger("lex2lt")
-    if _args_.debug:
-        _logger_.setLevel( logging.DEBUG )
-    else:
-        _logger_.setLevel( logging.INFO )
+    init_logger()
     _logger_.debug( "Command-line arguments: {}".format(_args_) )
     if not _args_.input_file:
         _logger_.error("Input file (-i) was not specified, aborting ...")
@@ -113,74 +134,75 @@ def parse_args():
     if not os.path.exists(_args_.map_file):
         _logger_.error("Map file '{}' does not exist, aborting ...".format(_args_.map_file))
         sys.exit(1)
+    if _args_.jobs > 1 and _args_.first_n_lines > 0:
+        _logger_.warn("Option -n can not be used with parallel jobs, using 1 job ...")
+        _args_.jobs = 1
+
+
+def init_logger():
+    global _logger_
+    logging.basicConfig(format=LOG_FORMAT)
+    _logger_ = logging.getLogger("lex2lt")
+    if _args_.debug:
+        _logger_.setLevel( logging.DEBUG )
+    else:
+        _logger_.setLevel( logging.INFO )
 
 
 # Open files for writing words in directory specified with "-b" option
-# Files are opened in append mode
+# Files are written through router, which buffers lines for each of them
 def open_out_files():
     global WORD_FILES
+    WORD_FILES = router.OutputRouter(_args_.buffer_size, _args_.max_open_files)
     for cl, lett in CYR_LETTERS.items():
         out_dir = os.path.join(_args_.base_dir, lett)
         if not os.path.exists( out_dir ):
             os.makedirs( out_dir )
-        WORD_FILES[ cl ] = list()
-        _logger_.debug( "Opening file {}/{}-lex-words.txt ...".format(out_dir, lett) )
-        WORD_FILES[ cl ].append( open( os.path.join(out_dir, lett + '-lex-words.txt'), 'wb' ) )
-        _logger_.debug( "Opening file {}/{}-lex-names.txt ...".format(out_dir, lett) )
-        WORD_FILES[ cl ].append( open( os.path.join(out_dir, lett + '-lex-names.txt'), 'wb' ) )
+        _logger_.debug( "Opening files {0}/{1}-lex-words.txt and {0}/{1}-lex-names.txt ...".format(out_dir, lett) )
+        WORD_FILES.add( cl, [ os.path.join(out_dir, lett + '-lex-words.txt'), os.path.join(out_dir, lett + '-lex-names.txt') ] )
 
 
 # Close all files containing words
 def close_out_files():
-    for cl, lett_files in WORD_FILES.items():
-        _logger_.debug('Closing file {}-lex-words.txt ...'.format(CYR_LETTERS[ cl ]))
-        lett_files[0].close()
-        _logger_.debug('Closing file {}-lex-names.txt ...'.format(CYR_LETTERS[ cl ]))
-        lett_files[1].close()
+    _logger_.debug('Closing word files ...')
+    WORD_FILES.close()
+    _logger_.info('Word files: {}.'.format(WORD_FILES))
+
+
+# Sort files containing words, removing duplicate lines
+def sort_out_files():
+    paths = WORD_FILES.paths()
+    _logger_.info("Sorting {} word files ...".format(len(paths)))
+    cnt = extsort.sort_files(paths, _args_.sort_run_size, _args_.tmp_dir or _args_.base_dir, jobs=_args_.jobs)
+    _logger_.info("Sorted word files: {} distinct lines.".format(cnt))
 
 
 # Initialization
 def init():
-    global _l2conv_, _l2comp_, _ciregex_, _cirdict_
-    # Create conversion dictionary for Latin to Cyrillic conversion
-    _l2conv_ = dict(zip(LAT_LIST, CIR_UTF_LIST))
-    _logger_.debug("Conversion dictionary Lat/Cir: {}".format(_l2conv_))
-    _l2comp_ = re.compile('|'.join(_l2conv_))
+    global _translit_, _cirdict_, _quarantine_
     # Read map file and populate map dictionary
     with open(_args_.map_file) as infile:
         _cirdict_ = dict(x.strip().split(None, 1) for x in infile if x.strip())
-    # Compile dictionary
-    keys = sorted(_cirdict_.keys(), key=len, reverse=True)
-    expression = []
-    for item in keys:
-        expression.append(re.escape(item))
     _logger_.debug("Replace map: {}".format(_cirdict_))
-    # Create a regular expression  from the dictionary keys
-    _ciregex_ = re.compile("(%s)" % "|".join(expression))
+    # Compile Latin to Cyrillic conversion and replace map
+    _translit_ = translit.Transliterator(LAT_LIST, CIR_UTF_LIST, _cirdict_)
+    _quarantine_ = quarantine.Quarantine(BAD_GROUPS)
 
 
 # Determine output file for word tripple
 # based on first letter of lemma
 def get_words_out_file( first_char ):
-    if first_char.lower() in WORD_FILES:
-        # Is this really a lower case?
-        if first_char == first_char.lower():
-            out_file = WORD_FILES[ first_char.lower() ][0]
-        else:
-            out_file = WORD_FILES[ first_char.lower() ][1]
-    else:
-        out_file = WORD_FILES[ 'misc' ][0]
-    return out_file
+    return router.route(WORD_FILES, first_char)
 
 
 # Go through input file, read word frequencies and prepare map file
 # Map file will be used in dictionary creation process
 def find_frequencies():
-    global _freqs_
+    global _freqs_, _freqcnt_
     cnt = 0
     matchcnt = 0
     _logger_.info("PASS 1: Started processing input file '{}', finding word frequencies ...".format(_args_.input_file))
-    freq = list()
+    freq = freqhist.FrequencyHistogram()
 
     with open(_args_.input_file) as f:
         for line in f:
@@ -194,8 +216,8 @@ def find_frequencies():
                 frequency = tokens[3]
                 _logger_.debug('frequency={}'.format(frequency))
                 # Do not take punctuation signs
-                if int(frequency) not in freq and posgr != 'Z':
-                    freq.append( int(frequency) )
+                if posgr != 'Z':
+                    freq.add( int(frequency) )
             else:
                 _logger_.warn("Unmatched line: {}".format(line))
             if cnt > _args_.first_n_lines > 0:
@@ -203,92 +225,216 @@ def find_frequencies():
         f.close()
     _logger_.info( "PASS 1: End processing input file '{}'.".format(_args_.input_file))
     _logger_.info( "PASS 1: Found {} different word frequencies.".format(len(freq)) )
-    _freqs_ = sorted(freq)
+    _freqs_ = freq.sorted()
+    _freqcnt_ = freq.counts()
 
 
 # Maps list of word frequencies to numbers from 0 to 255
+# Frequency 0 is special case, it is always mapped to 0
 def distribute_word_frequencies():
     global _freqmap_
     _logger_.info( "Frequencies: first {}, last {}.".format(_freqs_[0], _freqs_[-1]) )
-    # Special case
-    _freqmap_[ 0 ] = 0
-    len_freq = len(_freqs_)
     # Subtract frequency 0 and divide rest of the list in 255 buckets
-    bucket_size = (len_freq - 1) // 255 + 1
-    _logger_.debug( "Frequency list bucket size: {}".format(bucket_size) )
-
-    for msb in list(range(0, 255)):
-        #print( 'msb={}'.format(msb))
-        for lsb in list(range(0, bucket_size)):
-            ind = msb * bucket_size + lsb + 1
-            if ind < len_freq:
-                #print( 'lsb={} ind={} '.format(lsb, ind))
-                _freqmap_[ _freqs_[ ind ] ] = msb + 1
-        #print( " " )
+    buckets = freqbucket.FrequencyBuckets(_freqs_, 255, _args_.freq_distribution, _freqcnt_, zero_bucket=True)
+    _logger_.debug( "Frequency bucket boundaries: {}".format(buckets.boundaries) )
+    _freqmap_ = buckets.as_dict()
 
 
+# Returns "reason:group" if word contains some of BAD_GROUPS, otherwise None
 def has_bad_letters(word):
-    return any(x in word for x in BAD_GROUPS)
+    found = _quarantine_.match(word)
+    if found is None:
+        return None
+    return "{}:{}".format(*found)
 
 
 # Parse input file
-def parse_file():
-    cnt = 0
-    matchcnt = 0
-    _logger_.info("PASS 2: Started processing input file '{}' ...".format(_args_.input_file))
-    freqfile = open("serbian-wordlist.xml", "wb")
+# In single-pass mode (freq is a FrequencyHistogram) word frequencies are collected
+# while parsing and wordlist entries are written with raw frequencies
+# to "freqfile", which is then a spill file - see write_wordlist()
+def parse_file(freqfile, freq=None):
+    if freq is None:
+        _logger_.info("PASS 2: Started processing input file '{}' ...".format(_args_.input_file))
+    else:
+        _logger_.info("Started processing input file '{}' in single pass ...".format(_args_.input_file))
 
     with open(_args_.input_file) as f:
-        for line in f:
-            # Remove end of line
-            line = line.strip()
-            cnt += 1
-            tokens = line.split('\t')
-            if len(tokens) == 5:
-                matchcnt += 1
-                flexform = tokens[0]
-                lemma = tokens[1]
-                posgr = tokens[2]
-                frequency = tokens[3]
-                # We need to do transliterating here in order to avoid transliterating POS tag :(
-                flexform_lemma = "{}\t{}".format(flexform, lemma)
-                if lemma.upper() not in ('I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X'):
-                    # Transliterate all words in line, replacing Latin with Cyrillic characters
-                    flexform_lemma = _l2comp_.sub(lambda m: _l2conv_[m.group()], flexform_lemma)
-                    # Replace words according to replace map
-                    flexform_lemma = _ciregex_.sub(lambda mo: _cirdict_[mo.string[mo.start():mo.end()]], flexform_lemma)
-                    if has_bad_letters(flexform_lemma):
-                        out_file = WORD_FILES[ 'bad' ][0]
-                        out_file.write("{}\t{}\t{}\n".format(flexform_lemma, posgr, frequency).encode('utf-8'))
-                        continue
+        cnt, matchcnt = parse_lines(f, freqfile, freq)
+        f.close()
+    if freq is None:
+        _logger_.info("PASS 2: Finished processing input file '{}': total {} lines, {} matching lines.".format(
+            _args_.input_file, cnt, matchcnt))
+    else:
+        _logger_.info("Finished processing input file '{}': total {} lines, {} matching lines.".format(
+            _args_.input_file, cnt, matchcnt))
+
+
+# Converts lines of input file to rows (corpus.Row) with words transliterated
+# to Cyrillic, yielding (row, reason) for each matching line
+# Reason is "reason:group" for row with bad letters (see has_bad_letters()),
+# otherwise None. Numbers of lines and matching lines are added to stats
+def convert_lines(lines, stats):
+    for line in lines:
+        # Remove end of line
+        line = line.strip()
+        stats[ 'lines' ] += 1
+        tokens = line.split('\t')
+        if len(tokens) == 5:
+            stats[ 'matched' ] += 1
+            flexform = tokens[0]
+            lemma = tokens[1]
+            posgr = tokens[2]
+            frequency = tokens[3]
+            # We need to do transliterating here in order to avoid transliterating POS tag :(
+            flexform_lemma = "{}\t{}".format(flexform, lemma)
+            reason = None
+            if lemma.upper() not in ('I', 'II', 'III', 'IV', 'V', 'VI', 'VII', 'VIII', 'IX', 'X'):
+                # Transliterate all words in line, replacing Latin with Cyrillic characters
+                # and then replace words according to replace map
+                flexform_lemma = _translit_.convert(flexform_lemma)
+                reason = has_bad_letters(flexform_lemma)
+            if reason:
+                flexform, lemma = flexform_lemma.split('\t')
+            else:
                 # Split pair again after transliteration
                 tokens = flexform_lemma.split()
                 flexform, lemma = tokens
                 _logger_.debug('Converted flexform={}, lemma={}, posgr={}'.format(flexform, lemma, posgr))
-
-                # Determine file to write line in ...
-                out_file = get_words_out_file(lemma[0])
-                # Create line for writing in file
-                out_file.write("{}\t{}\t{}\t{}\n".format(
-                    flexform, lemma, posgr, frequency).encode('utf-8'))
-                # Write to frequency file
-                if posgr != 'Z':
-                    freqfile.write('<w f="{}" flags="">{}</w>\n'.format(_freqmap_[ int(frequency) ], flexform).encode('utf-8'))
+            yield corpus.Row(flexform, lemma, posgr, frequency), reason
+            if reason:
+                # Lines with bad letters are not checked against first_n_lines,
+                # so output of "-n" stays the same as before
+                continue
+        else:
+            _logger_.warn("Unmatched line: {}".format(line))
+        if stats[ 'lines' ] > _args_.first_n_lines > 0:
+            break
+
+
+# Parse lines of input file, writing them to WORD_FILES and freqfile
+# Returns number of lines and number of matching lines
+def parse_lines(lines, freqfile, freq):
+    stats = dict(lines=0, matched=0)
+    for row, reason in convert_lines(lines, stats):
+        # Do not take punctuation signs, nor lines after first_n_lines + 1,
+        # which PASS 1 (find_frequencies) does not read
+        if freq is not None and row.tag != 'Z' and not stats[ 'lines' ] > _args_.first_n_lines + 1 > 1:
+            freq.add( int(row.frequency) )
+        if reason:
+            out_file = WORD_FILES[ 'bad' ][0]
+            out_file.write("{}\t{}\n".format(row.line()[:-1], reason))
+            continue
+        # Determine file to write line in ...
+        out_file = get_words_out_file(row.lemma[0])
+        # Create line for writing in file
+        out_file.write(row.line())
+        # Write to frequency file
+        if row.tag != 'Z':
+            if freq is None:
+                freqfile.write('<w f="{}" flags="">{}</w>\n'.format(_freqmap_[ int(row.frequency) ], row.form).encode('utf-8'))
             else:
-                _logger_.warn("Unmatched line: {}".format(line))
-            if cnt > _args_.first_n_lines > 0:
-                break
-        f.close()
-    freqfile.close()
-    _logger_.info("PASS 2: Finished processing input file '{}': total {} lines, {} matching lines.".format(
-        _args_.input_file, cnt, matchcnt))
+                freqfile.write("{}\t{}\n".format(row.frequency, row.form).encode('utf-8'))
+    return stats[ 'lines' ], stats[ 'matched' ]
+
+
+# Write wordlist file from spill file made by parse_file() in single-pass mode
+# Spill file lines are in format: <frequency><TAB><flexform>
+def write_wordlist(spill, freqfile):
+    spill.seek(0)
+    for line in spill:
+        frequency, flexform = line.decode('utf-8').rstrip('\n').split('\t', 1)
+        freqfile.write('<w f="{}" flags="">{}</w>\n'.format(_freqmap_[ int(frequency) ], flexform).encode('utf-8'))
+
+
+# Read input file only once, spilling wordlist entries to temporary file
+# until frequency map can be made
+def single_pass():
+    global _freqs_, _freqcnt_
+    freq = freqhist.FrequencyHistogram()
+    with tempfile.TemporaryFile(dir=_args_.base_dir) as spill:
+        parse_file(spill, freq)
+        _logger_.info( "Found {} different word frequencies.".format(len(freq)) )
+        _freqs_ = freq.sorted()
+        _freqcnt_ = freq.counts()
+        distribute_word_frequencies()
+        _logger_.info( "Writing wordlist file from spill file ..." )
+        with open("serbian-wordlist.xml", "wb") as freqfile:
+            write_wordlist(spill, freqfile)
+
+
+# Initialization of worker process in parallel mode
+def init_worker(args):
+    global _args_
+    _args_ = args
+    init_logger()
+    init()
+
+
+# Converts one chunk of input file in worker process
+# Output is written to partial files in directory part_dir
+def convert_chunk(chunk):
+    global WORD_FILES
+    ind, start, end, part_dir = chunk
+    WORD_FILES = shard.make_buffers(CYR_LETTERS, 2)
+    freq = freqhist.FrequencyHistogram()
+    spill = os.path.join(part_dir, "{:06d}-wordlist.part".format(ind))
+    with open(spill, "wb") as spillfile:
+        cnt, matchcnt = parse_lines(shard.read_lines(_args_.input_file, start, end), spillfile, freq)
+    parts = shard.write_parts(part_dir, ind, WORD_FILES)
+    return parts, spill, freq.counts(), cnt, matchcnt
+
+
+# Converts input file in parallel, each worker converting one chunk of it
+# Like in single-pass mode, wordlist entries are spilled to partial files
+# until frequency map can be made
+def parallel():
+    global _freqs_, _freqcnt_
+    chunks = shard.split_file(_args_.input_file, _args_.jobs)
+    _logger_.info("Started processing input file '{}' in {} chunks, {} jobs ...".format(
+        _args_.input_file, len(chunks), _args_.jobs))
+    freq = freqhist.FrequencyHistogram()
+    spills = []
+    cnt = 0
+    matchcnt = 0
+    part_dir = tempfile.mkdtemp(dir=_args_.base_dir)
+    try:
+        with multiprocessing.Pool(_args_.jobs, init_worker, (_args_,)) as pool:
+            tasks = [ (ind, start, end, part_dir) for ind, (start, end) in enumerate(chunks) ]
+            # Results come in input order, so partial files are merged in that order
+            for parts, spill, counts, chunk_cnt, chunk_matchcnt in pool.imap(convert_chunk, tasks):
+                shard.merge_parts(parts, WORD_FILES)
+                spills.append(spill)
+                freq.merge(counts)
+                cnt += chunk_cnt
+                matchcnt += chunk_matchcnt
+        _logger_.info("Finished processing input file '{}': total {} lines, {} matching lines.".format(
+            _args_.input_file, cnt, matchcnt))
+        _logger_.info( "Found {} different word frequencies.".format(len(freq)) )
+        _freqs_ = freq.sorted()
+        _freqcnt_ = freq.counts()
+        distribute_word_frequencies()
+        _logger_.info( "Writing wordlist file from spill files ..." )
+        with open("serbian-wordlist.xml", "wb") as freqfile:
+            for spill in spills:
+                with open(spill, "rb") as spillfile:
+                    write_wordlist(spillfile, freqfile)
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
 
 
 if __name__ == "__main__":
     parse_args()
     init()
     open_out_files()
-    find_frequencies()
-    distribute_word_frequencies()
-    parse_file()
+    if _args_.jobs > 1:
+        parallel()
+    elif _args_.single_pass:
+        single_pass()
+    else:
+        find_frequencies()
+        distribute_word_frequencies()
+        with open("serbian-wordlist.xml", "wb") as freqfile:
+            parse_file(freqfile)
     close_out_files()
+    if _args_.sort:
+        sort_out_files()
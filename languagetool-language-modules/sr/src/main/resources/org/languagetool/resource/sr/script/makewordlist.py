@@ -10,6 +10,10 @@ import logging
 import os
 import sys
 
+import corpus
+import freqbucket
+import freqhist
+
 """
 Program creates wordlist file processing word list selected
 from database. Format of input file is:
@@ -17,23 +21,26 @@ from database. Format of input file is:
 wordform   lemma   postag   frequency
 
 Items are separated with <TAB> character.
+
+With option "-s" input file is read only once and held in memory
+as corpus.Corpus until frequency map is made.
 """
 
-_args_, _logger_, _freqs_, _freqmap_ = None, None, list(), dict()
+_args_, _logger_, _freqs_, _freqmap_, _freqcnt_ = None, None, list(), dict(), dict()
 LOG_FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Processes file containing Serbian word corpus.')
     parser.add_argument('-b', '--base', default=255, type=int)
     parser.add_argument('-d', '--debug',      action ='store_true', default=False)
+    parser.add_argument('-f', '--freq-distribution', default='equal', choices=freqbucket.DISTRIBUTIONS)
     parser.add_argument('-i', '--input-file', default=None)
     parser.add_argument('-n', '--first-n-lines', default=0, type=int)
     parser.add_argument('-o', '--output-file', default=None)
+    parser.add_argument('-s', '--single-pass', action ='store_true', default=False)
 
-    global _args_, _logger_
+    global _args_
     _args_ = parser.parse_args()
-    logging.basicConfig(format=LOG_FORMAT)
-    _logger_ = logging.getLogger("makewl")
     if _args_.debug:
         _logger_.setLevel( logging.DEBUG )
     else:
@@ -50,90 +57,116 @@ def parse_args():
         sys.exit(1)
 
 
+def init():
+    global _logger_
+    logging.basicConfig(format=LOG_FORMAT)
+    _logger_ = logging.getLogger("makewl")
+
+
+# Yields rows (corpus.Row) of lines with 4 columns, warning about other lines
+# Numbers of lines and matching lines are added to stats
+def read_rows(lines, stats):
+    for line in lines:
+        # Remove end of line
+        line = line.strip()
+        stats[ 'lines' ] += 1
+        tokens = line.split('\t')
+        if len(tokens) == 4:
+            stats[ 'matched' ] += 1
+            yield corpus.Row.from_tokens(tokens)
+        else:
+            _logger_.warn("Unmatched line: {}".format(line))
+        if stats[ 'lines' ] == _args_.first_n_lines > 0:
+            break
+
+
 # Go through input file, read word frequencies and prepare map file
 # Map file will be used in dictionary creation process
 def find_frequencies():
-    global _freqs_
-    cnt = 1
-    matchcnt = 0
+    global _freqs_, _freqcnt_
+    stats = dict(lines=0, matched=0)
     _logger_.info("PASS 1: Started processing input file '{}', getting word frequencies ...".format(_args_.input_file))
-    freq = list()
+    freq = freqhist.FrequencyHistogram()
 
     with open(_args_.input_file) as f:
-        for line in f:
-            # Remove end of line
-            line = line.strip()
-            tokens = line.split('\t')
-            if len(tokens) == 4:
-                matchcnt += 1
-                frequency = tokens[3]
-                _logger_.debug('cnt={} frequency={}'.format(cnt, frequency))
-                # Do not take punctuation signs
-                if int(frequency) not in freq:
-                    freq.append( int(frequency) )
-            else:
-                _logger_.warn("Unmatched line: {}".format(line))
-            if cnt == _args_.first_n_lines > 0:
-                break
-            cnt += 1
+        for row in read_rows(f, stats):
+            _logger_.debug('cnt={} frequency={}'.format(stats[ 'lines' ], row.frequency))
+            freq.add( row.frequency )
         f.close()
-    _logger_.info( "PASS 1: End processing input file '{}', matched {} lines.".format(_args_.input_file, matchcnt))
+    _logger_.info( "PASS 1: End processing input file '{}', matched {} lines.".format(_args_.input_file, stats[ 'matched' ]))
     _logger_.info( "PASS 1: Got {} different word frequencies.".format(len(freq)) )
-    _freqs_ = sorted(freq)
+    _freqs_ = freq.sorted()
+    _freqcnt_ = freq.counts()
+
 
+# Returns map of sorted word frequencies (counts: frequency => number of
+# words) to numbers from 1 to base. With default ("equal") distribution we try equal distribution
+def frequency_map(freqs, counts, base=255, distribution='equal'):
+    _logger_.info( "Frequencies: first {}, last {}.".format(freqs[0], freqs[-1]) )
+    buckets = freqbucket.FrequencyBuckets(freqs, base, distribution, counts)
+    _logger_.debug( "Frequency bucket boundaries: {}".format(buckets.boundaries) )
+    return buckets.as_dict()
 
-# Maps word frequencies to numbers from 1 to 255
-# With this algorithm we try equal distribution
+
+# Maps word frequencies to numbers from 1 to "-b"
 def distribute_word_frequencies():
     global _freqmap_
-    _logger_.info( "Frequencies: first {}, last {}.".format(_freqs_[0], _freqs_[-1]) )
-    len_freq = len(_freqs_)
-    bucket_size = len_freq // _args_.base + 1
-    _logger_.debug( "Frequency list bucket size: {}".format(bucket_size) )
-    cnt = 0
-
-    for msb in range(0, _args_.base):
-        for lsb in range(0, bucket_size):
-            cnt += 1
-            ind = msb * bucket_size + lsb
-            if ind < len_freq:
-                _freqmap_[ _freqs_[ ind ] ] = msb + 1
-                _logger_.debug( 'msb={} lsb={} ind={}, {} => {}'.format(msb, lsb, ind, _freqs_[ ind ], msb+1))
-            if cnt > _args_.first_n_lines > 0:
-                break
+    _freqmap_ = frequency_map(_freqs_, _freqcnt_, _args_.base, _args_.freq_distribution)
+
+
+# Yields lines of wordlist file for rows, frequencies are mapped with freqmap
+def wordlist_lines(rows, freqmap):
+    for row in rows:
+        yield '<w f="{}" flags="">{}</w>\n'.format(freqmap[ row.frequency ], row.form)
 
 
 # Parse input file
 def parse_file():
-    cnt = 1
-    matchcnt = 0
+    stats = dict(lines=0, matched=0)
     _logger_.info("PASS 2: Started processing input file '{}' ...".format(_args_.input_file))
-    freqfile = open(_args_.output_file, "wb")
 
-    with open(_args_.input_file) as f:
-        for line in f:
-            # Remove end of line
-            line = line.strip()
-            tokens = line.split('\t')
-            if len(tokens) == 4:
-                matchcnt += 1
-                flexform = tokens[0]
-                frequency = tokens[3]
-                # Write to frequency file
-                freqfile.write('<w f="{}" flags="">{}</w>\n'.format(_freqmap_[ int(frequency) ], flexform).encode('utf-8'))
-            else:
-                _logger_.warn("Unmatched line: {}".format(line))
-            if cnt == _args_.first_n_lines > 0:
-                break
-            cnt += 1
-        f.close()
-    freqfile.close()
+    with open(_args_.input_file) as f, open(_args_.output_file, "wb") as freqfile:
+        for line in wordlist_lines(read_rows(f, stats), _freqmap_):
+            # Write to frequency file
+            freqfile.write(line.encode('utf-8'))
     _logger_.info("PASS 2: Finished processing input file '{}': total {} lines, {} matching lines.".format(
-        _args_.input_file, cnt, matchcnt))
+        _args_.input_file, stats[ 'lines' ], stats[ 'matched' ]))
+
+
+# Read input file once, holding matching lines in memory
+def load_corpus():
+    global _freqs_, _freqcnt_
+    stats = dict(lines=0, matched=0)
+    rows = corpus.Corpus()
+    _logger_.info("Started processing input file '{}' in single pass ...".format(_args_.input_file))
+    with open(_args_.input_file) as f:
+        for row in read_rows(f, stats):
+            rows.append(row)
+    _logger_.info( "Loaded {} matching lines, about {} MB in memory.".format(len(rows), rows.memory() // (1024 * 1024)))
+    freq = freqhist.FrequencyHistogram()
+    freq.add_chunk(rows.frequencies)
+    _logger_.info( "Got {} different word frequencies.".format(len(freq)) )
+    _freqs_ = freq.sorted()
+    _freqcnt_ = freq.counts()
+    return rows
+
+
+# Write wordlist file from corpus held in memory
+def write_corpus(rows):
+    with open(_args_.output_file, "wb") as freqfile:
+        for flexform, frequency in zip(rows.forms, rows.frequencies):
+            freqfile.write('<w f="{}" flags="">{}</w>\n'.format(_freqmap_[ frequency ], flexform).encode('utf-8'))
+    _logger_.info("Finished writing file '{}'.".format(_args_.output_file))
 
 
 if __name__ == "__main__":
+    init()
     parse_args()
-    find_frequencies()
-    distribute_word_frequencies()
-    parse_file()
+    if _args_.single_pass:
+        rows = load_corpus()
+        distribute_word_frequencies()
+        write_corpus(rows)
+    else:
+        find_frequencies()
+        distribute_word_frequencies()
+        parse_file()
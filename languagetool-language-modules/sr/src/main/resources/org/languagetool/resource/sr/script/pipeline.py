@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Program converts Serbian word corpus to word corpus for LT routines
+# in one process, without intermediate per-letter files.
+
+import argparse
+import itertools
+import logging
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import corpus
+import extsort
+import freqbucket
+import freqhist
+import lex2pos
+import makewordlist
+import pos2lt
+import router
+import tag2corp
+import wic2pos
+
+"""
+Program does in one process what is done by chain of programs talking
+through per-letter files:
+
+    lex2pos.py / wic2pos.py -> pos2lt.py for each file (tag2corp.sh) -> sort -u
+                            -> makewordlist.py
+
+Stages are generators over rows of word corpus (corpus.Row) taken from
+these programs, so each input line is split and encoded only once:
+
+    lex2pos.convert_lines    - input lines => rows in Cyrillic, with bad letters reason
+    wic2pos.convert_lines      (selected by "-r")
+    write_rows               - writes rows to per-letter files (only with "-p")
+    select_rows              - drops rows which do not go to word corpus
+    collect_rows             - keeps rows in memory for wordlist (only with "-w")
+    pos2lt.tag_rows          - PoS tags => LT tags
+    write_tagged             - writes tagged per-letter files (only with "--tagged")
+
+Word corpus and word corpus for Hunspell are written to output directory
+with the same names as tag2corp.py does. With option "-w" also wordlist file
+is made by makewordlist.wordlist_lines() from rows of per-letter files, in
+order in which tag2corp.sh reads them.
+
+Run with option "--benchmark" to run also the file-based chain in temporary
+directory, comparing time and output.
+"""
+
+_args_, _logger_, _converter_ = None, None, None
+LOG_FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+
+# Converters of input file by regex type
+CONVERTERS = {
+    'lex' : lex2pos,
+    'wic' : wic2pos
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Converts Serbian word corpus to word corpus for LT in one process.')
+    parser.add_argument('--base', default=255, type=int, help='highest wordlist frequency')
+    parser.add_argument('--benchmark', action ='store_true', default=False, help='compare with file-based chain of programs')
+    parser.add_argument('-d', '--debug',      action ='store_true', default=False)
+    parser.add_argument('-f', '--freq-distribution', default='equal', choices=freqbucket.DISTRIBUTIONS)
+    parser.add_argument('-i', '--input-file', default=None)
+    parser.add_argument('-m', '--map-file', default=None)
+    parser.add_argument('-n', '--first-n-lines', default=0, type=int)
+    parser.add_argument('-o', '--output-dir', default='/opt/app/s/smd/lt')
+    parser.add_argument('-p', '--pos-dir', default=None, help='also write per-letter word files to this directory')
+    parser.add_argument('-r', '--regex', default=None, choices=sorted(CONVERTERS))
+    parser.add_argument('--sort-run-size', default=extsort.RUN_SIZE, type=int, help='lines sorted in memory at once')
+    parser.add_argument('--tagged', action ='store_true', default=False, help='also write tagged per-letter files')
+    parser.add_argument('-t', '--tmp-dir', default=None, help='directory for temporary files, output directory by default')
+    parser.add_argument('-w', '--wordlist-file', default=None)
+    global _args_
+    _args_ = parser.parse_args()
+    init_logger()
+    _logger_.debug( "Command-line arguments: {}".format(_args_) )
+    if not _args_.input_file:
+        _logger_.error("Input file (-i) was not specified, aborting ...")
+        sys.exit(1)
+    if not _args_.regex:
+        _logger_.error("Regex expression (-r) was not specified, aborting ...")
+        sys.exit(1)
+    if not _args_.map_file:
+        _logger_.error("Map file (-m) was not specified, aborting ...")
+        sys.exit(1)
+    if not os.path.exists(_args_.input_file):
+        _logger_.error("Input file '{}' does not exist, aborting ...".format(_args_.input_file))
+        sys.exit(1)
+    if not os.path.exists(_args_.map_file):
+        _logger_.error("Map file '{}' does not exist, aborting ...".format(_args_.map_file))
+        sys.exit(1)
+    if not _args_.benchmark and not os.path.isdir(_args_.output_dir):
+        _logger_.error("Output directory '{}' does not exist, aborting ...".format(_args_.output_dir))
+        sys.exit(1)
+
+
+def init_logger():
+    global _logger_
+    logging.basicConfig(format=LOG_FORMAT)
+    _logger_ = logging.getLogger("pipeline")
+    pos2lt.init()
+    makewordlist.init()
+    for logger in (_logger_, pos2lt._logger_, makewordlist._logger_):
+        if _args_.debug:
+            logger.setLevel( logging.DEBUG )
+        else:
+            logger.setLevel( logging.INFO )
+
+
+# Initialization of converter selected by "-r"
+def init():
+    global _converter_
+    _converter_ = CONVERTERS[ _args_.regex ]
+    _converter_.init_worker(_args_)
+
+
+# Returns dictionary Cyrillic letter => [ (directory, file type) ] of per-letter
+# files of converter, the same as files of tag2corp.sh
+def letter_files(letters):
+    return dict((cl, [ (lett, fext) for fext in tag2corp.FILE_TYPES ]) for cl, lett in letters.items())
+
+
+# Writes (row, reason) pairs to per-letter word files of router files,
+# bad rows to file of key "bad", yielding pairs on
+def write_rows(rows, files):
+    for row, reason in rows:
+        if reason:
+            files[ 'bad' ][0].write("{}\t{}\n".format(row.line()[:-1], reason))
+        else:
+            router.route(files, row.lemma[0]).write(row.line())
+        yield row, reason
+
+
+# Yields rows going to some per-letter file of word corpus (see letter_files()),
+# dropping bad rows and rows going to other files
+def select_rows(rows, files):
+    letters = set(tag2corp.LETTERS)
+    for row, reason in rows:
+        if reason is None and router.route(files, row.lemma[0])[0] in letters:
+            yield row
+
+
+# Adds rows to corpora (corpus.Corpus) of their per-letter files, yielding rows on
+def collect_rows(rows, files, corpora):
+    for row in rows:
+        dest = router.route(files, row.lemma[0])
+        rows_of_file = corpora.get(dest)
+        if rows_of_file is None:
+            rows_of_file = corpora[ dest ] = corpus.Corpus()
+        rows_of_file.add(row.form, row.lemma, row.tag, int(row.frequency))
+        yield row
+
+
+# Writes tagged rows to per-letter files in output directory, named like
+# tag2corp.sh names them, yielding rows on
+def write_tagged(rows, files, out_files):
+    for row in rows:
+        dest = router.route(files, row.lemma[0])
+        if dest not in out_files:
+            out_files.add(dest, [ os.path.join(_args_.output_dir, "{}-{}.txt".format(*dest)) ])
+        out_files[ dest ][0].write(row.line())
+        yield row
+
+
+# Writes wordlist file made of rows held in corpora, in order of per-letter files
+def write_wordlist(corpora):
+    order = [ (lett, fext) for lett in tag2corp.LETTERS for fext in tag2corp.FILE_TYPES ]
+    corpora = [ corpora[ dest ] for dest in order if dest in corpora ]
+    freq = freqhist.FrequencyHistogram()
+    for rows in corpora:
+        freq.add_chunk(rows.frequencies)
+    _logger_.info( "Got {} different word frequencies.".format(len(freq)) )
+    if len(freq) == 0:
+        _logger_.warn("There are no words for wordlist file '{}'.".format(_args_.wordlist_file))
+        open(_args_.wordlist_file, "wb").close()
+        return
+    freqmap = makewordlist.frequency_map(freq.sorted(), freq.counts(), _args_.base, _args_.freq_distribution)
+    with open(_args_.wordlist_file, "wb") as freqfile:
+        for line in makewordlist.wordlist_lines(itertools.chain.from_iterable(corpora), freqmap):
+            freqfile.write(line.encode('utf-8'))
+    _logger_.info("Wordlist is ready in file '{}'.".format(_args_.wordlist_file))
+
+
+# Runs all stages on input file
+def run():
+    files = letter_files(_converter_.CYR_LETTERS)
+    stats = dict(lines=0, matched=0, tagged=0)
+    corpora = dict()
+    pos_files = None
+    tagged_files = None
+    key = tag2corp.get_sort_key()
+    tmp_dir = _args_.tmp_dir or _args_.output_dir
+    # Word forms are sorted in runs while corpus lines are being sorted
+    forms = extsort.RunWriter(_args_.sort_run_size, tmp_dir, key)
+    _logger_.info("Started processing input file '{}' ...".format(_args_.input_file))
+    with open(_args_.input_file) as f:
+        rows = _converter_.convert_lines(f, stats)
+        if _args_.pos_dir:
+            pos_files = router.OutputRouter()
+            for cl, lett in _converter_.CYR_LETTERS.items():
+                out_dir = os.path.join(_args_.pos_dir, lett)
+                os.makedirs(out_dir, exist_ok=True)
+                pos_files.add(cl, [ os.path.join(out_dir, "{}-{}.txt".format(lett, fext)) for fext in tag2corp.FILE_TYPES ])
+            rows = write_rows(rows, pos_files)
+        rows = select_rows(rows, files)
+        if _args_.wordlist_file:
+            rows = collect_rows(rows, files, corpora)
+        rows = pos2lt.tag_rows(rows)
+        if _args_.tagged:
+            tagged_files = router.OutputRouter()
+            rows = write_tagged(rows, files, tagged_files)
+        def corpus_lines():
+            for row in rows:
+                stats[ 'tagged' ] += 1
+                forms.add(row.form + '\n')
+                yield row.line()
+        corpus_file = os.path.join(_args_.output_dir, tag2corp.CORPUS_FILE)
+        cnt = extsort.write_sorted(corpus_lines(), corpus_file, _args_.sort_run_size, tmp_dir, key=key)
+    for out_files in (pos_files, tagged_files):
+        if out_files is not None:
+            out_files.close()
+            _logger_.info("Written files: {}.".format(out_files))
+    _logger_.info("Finished processing input file '{}': total {} lines, {} matching lines, {} tagged rows.".format(
+        _args_.input_file, stats[ 'lines' ], stats[ 'matched' ], stats[ 'tagged' ]))
+    _logger_.info("Found following distinctive LT tags: {}".format(sorted(pos2lt.DIST_TAGS)))
+    _logger_.info("Serbian word corpus is ready in file '{}' ({} lines).".format(corpus_file, cnt))
+    hunspell_file = os.path.join(_args_.output_dir, tag2corp.HUNSPELL_FILE)
+    try:
+        cnt = forms.write(hunspell_file)
+    finally:
+        forms.close()
+    _logger_.info("Serbian word corpus for Hunspell is ready in file '{}' ({} lines).".format(hunspell_file, cnt))
+    if _args_.wordlist_file:
+        write_wordlist(corpora)
+    if _converter_ is wic2pos and wic2pos.report_tag_errors():
+        return 1
+    return 0
+
+
+# Runs file-based chain of programs in directory work_dir, the same way as
+# they are run one after another: lex2pos.py/wic2pos.py, then pos2lt.py and
+# "sort -u" as in tag2corp.sh and makewordlist.py on per-letter files
+# Returns list of (step, elapsed time)
+def run_file_chain(work_dir):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    pos_dir = os.path.join(work_dir, 'pos')
+    lt_dir = os.path.join(work_dir, 'lt')
+    os.makedirs(lt_dir)
+    quiet = dict(check=True, stderr=subprocess.DEVNULL)
+    times = []
+
+    start = time.perf_counter()
+    subprocess.run([ sys.executable, os.path.join(script_dir, _args_.regex + '2pos.py'),
+                     '-i', os.path.abspath(_args_.input_file), '-m', os.path.abspath(_args_.map_file),
+                     '-r', _args_.regex, '-b', pos_dir, '-n', str(_args_.first_n_lines) ], cwd=work_dir, **quiet)
+    times.append(("{}2pos.py".format(_args_.regex), time.perf_counter() - start))
+
+    start = time.perf_counter()
+    word_files = []
+    tagged_files = []
+    for lett in tag2corp.LETTERS:
+        for fext in tag2corp.FILE_TYPES:
+            path = os.path.join(pos_dir, lett, "{}-{}-{}.txt".format(lett, _args_.regex, fext))
+            if os.path.isfile(path) and os.path.getsize(path) > 0:
+                subprocess.run([ sys.executable, os.path.join(script_dir, 'pos2lt.py'), '-i', path, '-o', lt_dir ], **quiet)
+                word_files.append(path)
+                tagged_files.append(os.path.join(lt_dir, os.path.basename(path)))
+    times.append(("pos2lt.py", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    subprocess.run([ 'sort', '-u', '-o', os.path.join(lt_dir, tag2corp.CORPUS_FILE) ] + tagged_files, **quiet)
+    forms_file = os.path.join(lt_dir, 'hunspell-serbian-corpus.tmp')
+    with open(forms_file, 'wb') as out:
+        subprocess.run([ 'cut', '-f1' ] + tagged_files, stdout=out, **quiet)
+    subprocess.run([ 'sort', '-u', '-o', os.path.join(lt_dir, tag2corp.HUNSPELL_FILE), forms_file ], **quiet)
+    times.append(("sort -u", time.perf_counter() - start))
+
+    start = time.perf_counter()
+    words_file = os.path.join(work_dir, 'words.txt')
+    with open(words_file, 'wb') as out:
+        for path in word_files:
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, out)
+    subprocess.run([ sys.executable, os.path.join(script_dir, 'makewordlist.py'), '-i', words_file,
+                     '-o', os.path.join(lt_dir, 'wordlist.xml'), '-b', str(_args_.base),
+                     '-f', _args_.freq_distribution ], **quiet)
+    times.append(("makewordlist.py", time.perf_counter() - start))
+    return times
+
+
+# Runs file-based chain and pipeline on input file, comparing time and output
+def benchmark():
+    work_dir = tempfile.mkdtemp(dir=_args_.tmp_dir)
+    try:
+        times = run_file_chain(work_dir)
+        for step, elapsed in times:
+            _logger_.info("{:<20} {:>8.3f} s".format(step, elapsed))
+        _logger_.info("{:<20} {:>8.3f} s".format("file-based chain", sum(elapsed for step, elapsed in times)))
+
+        _args_.output_dir = os.path.join(work_dir, 'pipeline')
+        _args_.wordlist_file = os.path.join(_args_.output_dir, 'wordlist.xml')
+        os.makedirs(_args_.output_dir)
+        start = time.perf_counter()
+        init()
+        run()
+        _logger_.info("{:<20} {:>8.3f} s".format("pipeline", time.perf_counter() - start))
+
+        for fname in (tag2corp.CORPUS_FILE, tag2corp.HUNSPELL_FILE, 'wordlist.xml'):
+            with open(os.path.join(work_dir, 'lt', fname), 'rb') as old, \
+                 open(os.path.join(_args_.output_dir, fname), 'rb') as new:
+                if old.read() != new.read():
+                    _logger_.error("Results differ for {}".format(fname))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parse_args()
+    if _args_.benchmark:
+        benchmark()
+        sys.exit(0)
+    init()
+    sys.exit(run())
@@ -11,13 +11,14 @@ import logging
 import os
 import sys
 
+import corpus
 import srptagging
 
 _args_ = None
 _logger_ = None
 _out_file_ = None
 LOG_FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
-DIST_TAGS = []
+DIST_TAGS = set()
 
 def parse_args():
     parser = argparse.ArgumentParser(description='Changes PoS tags to LT tags in file containing Serbian word corpus.')
@@ -68,11 +69,53 @@ def check_word_type(lemma, postag, lttag):
     return lttag
 
 def count_tags(lttag):
-    global DIST_TAGS
-    taglist = lttag.split(':')
-    for tag in taglist:
-        if not tag in DIST_TAGS:
-            DIST_TAGS.append(tag)
+    DIST_TAGS.update(lttag.split(':'))
+
+# Replaces PoS tag of row with LT tag
+# Returns new row without frequency, or None if there is no LT tag for row
+def tag_row(row):
+    # Check if there is a tag
+    if len(row.tag) > 0:
+        try:
+            lttag = srptagging.get_tag_cached(row.tag, ':')
+            if lttag.find('ERROR') != -1:
+                _logger_.error("{} for wordform {}, lemma {}".format(lttag, row.form, row.lemma))
+                return None
+            count_tags(lttag)
+        except KeyError:
+            _logger_.error("Getting LT tag: wordform {}, lemma {}, tag {}".format(row.form, row.lemma, row.tag))
+            return None
+        # Handle special cases and word types
+        newltag = check_word_type(row.lemma, row.tag, lttag)
+        if lttag not in (None, ''):
+            return corpus.Row(row.form, row.lemma, newltag)
+        _logger_.warn("For PoS tag '{}' no LT tag found. Line: '{}'".format(row.tag, row.line().rstrip('\n')))
+    else:
+        _logger_.warn("No PoS tag found on line: {}".format(row.line().rstrip('\n')))
+    return None
+
+
+# Yields rows with LT tags instead of PoS tags, skipping rows without LT tag
+def tag_rows(rows):
+    for row in rows:
+        row = tag_row(row)
+        if row is not None:
+            yield row
+
+
+# Replaces PoS tag in line of input file with LT tag
+# Returns output line, or None if there is no LT tag for line
+def tag_line(line):
+    # Remove end of line
+    line = line.strip()
+    # Get PoS tag
+    lparts = line.split('\t')
+    # Lemma and tag are interned
+    row = tag_row(corpus.Row(lparts[0], lparts[1], lparts[2], lparts[3] if len(lparts) > 3 else None))
+    if row is None:
+        return None
+    return row.line()
+
 
 # Parse input file
 def parse_file():
@@ -81,35 +124,17 @@ def parse_file():
 
     with open(_args_.input_file) as f:
         for line in f:
-            # Remove end of line
-            line = line.strip()
             cnt += 1
-            # Get PoS tag
-            lparts = line.split('\t')
-            # Check if there is a tag
-            if len(lparts[2]) > 0:
-                try:
-                    lttag = srptagging.get_tag(lparts[2], ':')
-                    if lttag.find('ERROR') != -1:
-                        _logger_.error("{} for wordform {}, lemma {}".format(lttag, lparts[0], lparts[1]))
-                        continue
-                    count_tags(lttag)
-                except KeyError:
-                    _logger_.error("Getting LT tag: wordform {}, lemma {}, tag {}".format(lparts[0], lparts[1], lparts[2]))
-                    continue
-                # Handle special cases and word types
-                newltag = check_word_type(lparts[1], lparts[2], lttag)
-                if lttag not in (None, ''):
-                    _out_file_.write("{}\t{}\t{}\n".format(lparts[0], lparts[1], newltag).encode('utf-8'))
-                else:
-                    _logger_.warn("For PoS tag '{}' no LT tag found. Line: '{}'".format(line))
-            else:
-                _logger_.warn("No PoS tag found on line: {}".format(line))
+            out_line = tag_line(line)
+            if out_line is not None:
+                _out_file_.write(out_line.encode('utf-8'))
             if cnt > _args_.first_n_lines > 0:
                 break
         f.close()
     _logger_.info("Finished processing input file '{}': total {} lines.".format(_args_.input_file, cnt))
     _logger_.info("Found following distinctive LT tags: {}".format(sorted(DIST_TAGS)))
+    _logger_.info("LT tag cache: {hits} hits, {misses} misses, {cached} cached tags, {table} tags in table.".format(
+        **srptagging.get_cache_stats()))
 
 
 if __name__ == "__main__":
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Finds words which should be put aside ("quarantined") because they contain
+some suspicious group of letters, telling also why. Used by lex2pos.py and
+wic2pos.py for "bad" files, it does not depend on Serbian language.
+
+Groups of letters are given by reason code:
+
+    { 'foreign-letter' : ('q', 'w'), 'double-vowel' : ('аа', 'ии') }
+
+All groups are found in one pass over text using Aho-Corasick automaton
+from pyahocorasick package. When pyahocorasick is not installed, regular
+expression made of all groups (longest first) is used instead. Both report
+leftmost group in text, the longest one if more groups start there.
+
+Run as program to compare with searching groups one by one:
+
+    ./quarantine.py -i wic.txt
+"""
+
+import re
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class Quarantine:
+
+    # Param groups: dictionary reason code => groups of letters
+    def __init__(self, groups):
+        self._reasons = dict()
+        for reason, patterns in groups.items():
+            for pattern in patterns:
+                if pattern in self._reasons:
+                    raise ValueError("Group '{}' has two reasons".format(pattern))
+                self._reasons[ pattern ] = reason
+        self._automaton = None
+        self._regex = None
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for pattern in self._reasons:
+                self._automaton.add_word(pattern, pattern)
+            self._automaton.make_automaton()
+        else:
+            patterns = sorted(self._reasons, key=len, reverse=True)
+            self._regex = re.compile("|".join(re.escape(pattern) for pattern in patterns))
+
+    # Returns (reason code, group) of leftmost group found in text,
+    # or None if there is no group in it
+    def match(self, text):
+        if self._automaton is not None:
+            matches = self._automaton.iter(text)
+            first = next(matches, None)
+            if first is None:
+                return None
+            # Automaton reports matches by their end, so other matches are
+            # checked for leftmost start
+            end, pattern = first
+            best = (end - len(pattern), -len(pattern), pattern)
+            for end, pattern in matches:
+                best = min(best, (end - len(pattern), -len(pattern), pattern))
+            pattern = best[2]
+        else:
+            m = self._regex.search(text)
+            if m is None:
+                return None
+            pattern = m.group()
+        return self._reasons[ pattern ], pattern
+
+    # Returns reason code of leftmost group found in text, or None
+    def classify(self, text):
+        found = self.match(text)
+        return None if found is None else found[0]
+
+
+# Compares Quarantine with searching groups one by one on "flexform<TAB>lemma"
+# pairs taken from input file
+def _benchmark(input_file, lines):
+    import time
+    from lex2pos import BAD_GROUPS
+    pairs = []
+    with open(input_file) as f:
+        for line in f:
+            tokens = line.strip().split('\t')
+            if len(tokens) >= 2:
+                pairs.append("{}\t{}".format(tokens[0], tokens[1]))
+            if len(pairs) == lines:
+                break
+    groups = [ pattern for patterns in BAD_GROUPS.values() for pattern in patterns ]
+    quarantine = Quarantine(BAD_GROUPS)
+    print("Checking {} pairs for {} groups, pyahocorasick {}".format(
+        len(pairs), len(groups), "installed" if ahocorasick else "not installed"))
+    results = []
+    for name, check in (('substrings', lambda word: any(x in word for x in groups)),
+                        ('quarantine', lambda word: quarantine.match(word) is not None)):
+        start = time.perf_counter()
+        results.append([ check(pair) for pair in pairs ])
+        elapsed = time.perf_counter() - start
+        print("{:<12} {:>10.3f} s {:>12.0f} pairs/s, {} quarantined".format(
+            name, elapsed, len(pairs) / elapsed, sum(results[-1])))
+    if results[0] != results[1]:
+        print("ERROR: Results differ")
+
+
+# Run benchmark by running this module directly
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmarks finding of suspicious groups of letters.')
+    parser.add_argument('-i', '--input-file', required=True)
+    parser.add_argument('-n', '--first-n-lines', default=0, type=int)
+    args = parser.parse_args()
+    _benchmark(args.input_file, args.first_n_lines)
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Helpers for converting input file in parallel (option --jobs of lex2pos.py
+and wic2pos.py).
+
+Input file is split into byte ranges aligned to line ends. Each range is
+converted by one worker, which keeps its output in memory buffers and then
+writes non-empty buffers to partial files, encoded at once. Partial files are appended to
+final output files in input order, so the result does not depend on number
+of workers.
+"""
+
+import io
+import locale
+import os
+
+# Default size of one chunk of input file, in bytes
+CHUNK_SIZE = 16 * 1024 * 1024
+
+
+# Splits file into list of (start, end) byte ranges
+# There will be at least "jobs" ranges, each not much bigger than chunk_size
+def split_file(path, jobs, chunk_size=CHUNK_SIZE):
+    size = os.path.getsize(path)
+    count = max(jobs, (size + chunk_size - 1) // chunk_size, 1)
+    bounds = [0]
+    with open(path, 'rb') as f:
+        for i in range(1, count):
+            f.seek(max(size * i // count - 1, bounds[-1]))
+            f.readline()
+            pos = f.tell()
+            if bounds[-1] < pos < size:
+                bounds.append(pos)
+    bounds.append(size)
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# Returns lines from byte range, read the same way as with open(path)
+def read_lines(path, start, end):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        data = f.read(end - start)
+    return io.StringIO(data.decode(locale.getpreferredencoding(False)), newline=None)
+
+
+# Makes memory buffers in place of output files
+# Keys is dictionary key => file name, keys with the same file share buffers
+# Returns dictionary key => list of "count" text buffers
+def make_buffers(keys, count):
+    shared = dict()
+    for key, name in keys.items():
+        if name not in shared:
+            shared[ name ] = [ io.StringIO() for _ in range(count) ]
+    return dict((key, shared[ name ]) for key, name in keys.items())
+
+
+# Writes non-empty buffers of one chunk to partial files in directory part_dir
+# Returns list of (key, index, partial file name)
+def write_parts(part_dir, chunk, buffers):
+    parts = []
+    written = set()
+    for num, (key, outs) in enumerate(sorted(buffers.items())):
+        for ind, buf in enumerate(outs):
+            if buf.tell() > 0 and id(buf) not in written:
+                written.add(id(buf))
+                name = os.path.join(part_dir, "{:06d}-{:03d}-{}.part".format(chunk, num, ind))
+                with open(name, 'wb') as part:
+                    part.write(buf.getvalue().encode('utf-8'))
+                parts.append((key, ind, name))
+    return parts
+
+
+# Appends partial files of one chunk to output files and removes them
+# Files is router.OutputRouter
+def merge_parts(parts, files):
+    for key, ind, name in parts:
+        with open(name, 'rb') as part:
+            files[ key ][ ind ].write_encoded(part.read())
+        os.remove(name)
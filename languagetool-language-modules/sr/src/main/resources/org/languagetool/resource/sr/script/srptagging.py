@@ -5,6 +5,11 @@
 This program makes POS tags for Serbian dictionary used in LanguageTool (LT).
 """
 
+import collections
+import hashlib
+import logging
+import os
+
 # PoS tags and their descriptions (in Serbian)
 DDESC = {
     '0J' : 'једнина', # број
@@ -618,6 +623,98 @@ def get_tag(msd, sep):
         return "Unknown word type: {}".format(beglet)
 
 
+# There are only a few thousand distinct MSD tags in word corpus,
+# so LT tags are calculated once and kept in LRU cache.
+# MSD => LT tag table can also be made in advance (see dump_tag_table)
+# and it is then loaded when this module is imported. Table header has
+# hash of this file, table made by other version of it is not loaded.
+TAG_CACHE_SIZE = 16384
+TAG_TABLE_SEP = ':'
+TAG_TABLE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'srptagging-table.txt')
+TAG_TABLE_HEADER = '# srptagging '
+
+_tag_cache_ = collections.OrderedDict()
+_tag_table_ = dict()
+_tag_stats_ = dict(hits=0, misses=0)
+
+
+# Same as get_tag, but result is looked up in MSD => LT tag table
+# or in LRU cache first
+def get_tag_cached(msd, sep):
+    if sep == TAG_TABLE_SEP and msd in _tag_table_:
+        _tag_stats_[ 'hits' ] += 1
+        return _tag_table_[ msd ]
+    key = (msd, sep)
+    if key in _tag_cache_:
+        _tag_stats_[ 'hits' ] += 1
+        _tag_cache_.move_to_end(key)
+        return _tag_cache_[ key ]
+    _tag_stats_[ 'misses' ] += 1
+    tag = get_tag(msd, sep)
+    _tag_cache_[ key ] = tag
+    if len(_tag_cache_) > TAG_CACHE_SIZE:
+        _tag_cache_.popitem(last=False)
+    return tag
+
+
+# Returns number of cache hits and misses and cache sizes
+def get_cache_stats():
+    return dict(_tag_stats_, cached=len(_tag_cache_), table=len(_tag_table_))
+
+
+# Returns SHA-1 of this file, which has both mapping dicts and tagging code
+def get_source_hash():
+    with open(os.path.abspath(__file__), 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+# Writes MSD => LT tag table for all MSD tags found in third column
+# of given corpus files. Format of table file is header line
+# "# srptagging <hash>" (see get_source_hash), then: <MSD tag><TAB><LT tag>
+def dump_tag_table(corpus_files, table_file=TAG_TABLE_FILE):
+    msds = set()
+    for corpus_file in corpus_files:
+        with open(corpus_file) as f:
+            for line in f:
+                lparts = line.strip().split('\t')
+                if len(lparts) > 2 and lparts[2]:
+                    msds.add(lparts[2])
+    cnt = 0
+    with open(table_file, 'w') as f:
+        f.write("{}{}\n".format(TAG_TABLE_HEADER, get_source_hash()))
+        for msd in sorted(msds):
+            try:
+                tag = get_tag(msd, TAG_TABLE_SEP)
+            except (KeyError, IndexError):
+                continue
+            f.write("{}\t{}\n".format(msd, tag))
+            cnt += 1
+    return cnt
+
+
+# Loads MSD => LT tag table written by dump_tag_table
+# Table made by other version of this file is ignored with a warning
+# Returns True if table was loaded
+def load_tag_table(table_file=TAG_TABLE_FILE):
+    global _tag_table_
+    table = dict()
+    with open(table_file) as f:
+        header = f.readline().rstrip('\n')
+        if header != TAG_TABLE_HEADER + get_source_hash():
+            logging.getLogger("srptagging").warning(
+                "Tag table '%s' was not made by this version of srptagging.py, ignoring it", table_file)
+            return False
+        for line in f:
+            msd, tag = line.rstrip('\n').split('\t', 1)
+            table[ msd ] = tag
+    _tag_table_ = table
+    return True
+
+
+if os.path.exists(TAG_TABLE_FILE):
+    load_tag_table()
+
+
 # Pretty printing PoS tag and description
 def pprint(tag, desc):
     if desc is not None:
@@ -1712,7 +1809,11 @@ if __name__ == "__main__":
     import sys
     cmd = sys.argv[1]
     ssep = ':'
-    if cmd == '-l':
+    if cmd == '-c':
+        # Create MSD to LT tag table from corpus files given as other arguments
+        cnt = dump_tag_table(sys.argv[2:])
+        print("Written {} MSD tags to '{}'.".format(cnt, TAG_TABLE_FILE))
+    elif cmd == '-l':
         # List LT tags and their descriptions
         get_list(ssep, True)
     elif cmd == '-s':
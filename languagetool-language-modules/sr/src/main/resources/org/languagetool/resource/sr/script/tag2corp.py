@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Program changes PoS tags to LT tags in all per-letter word files,
+# like tag2corp.sh, and creates word corpus for LT routines that create
+# POS dictionary and synth dictionary, and word corpus for Hunspell.
+
+import argparse
+import locale
+import logging
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+
+import extsort
+import pos2lt
+
+"""
+All files are tagged in one program run, by "-j" worker processes, using
+pos2lt.tag_line(). Each worker writes tagged file to output directory (the
+same file as pos2lt.py writes) and at the same time sorted lines and sorted
+word forms of it to temporary files. These are then merged in order of input
+files, dropping duplicates, so that:
+
+serbian-corpus.txt          - is the same as "sort -u" of all tagged files
+hunspell-serbian-corpus.txt - is the same as "sort -u" of their first column
+
+Lines are sorted in the same way as "sort" does in current locale (LC_COLLATE).
+"""
+
+_args_, _logger_ = None, None
+LOG_FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
+
+# Author of this script split giant Serbian word corpus into smaller files.
+# Each file contains words where lemma starts with directory name,
+# example: words that start with letter "j" are in file <input dir>/je/je-words.txt
+LETTERS = ('a', 'be', 'ce', 'ch', 'de', 'dje', 'dzhe', 'ef', 'em', 'en', 'er', 'es', 'e', 'ge', 'ha', 'i', 'je',
+           'ka', 'ell', 'lje', 'nje', 'o', 'pe', 'sha', 'te', 'tshe', 'u', 've', 'ze', 'zhe', 'misc')
+FILE_TYPES = ('words', 'names')
+
+CORPUS_FILE = 'serbian-corpus.txt'
+HUNSPELL_FILE = 'hunspell-serbian-corpus.txt'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Changes PoS tags to LT tags in all Serbian word files, creating word corpus.')
+    parser.add_argument('-d', '--debug',      action ='store_true', default=False)
+    parser.add_argument('-i', '--input-dir',  default='/opt/app/s/smd/pos')
+    parser.add_argument('-j', '--jobs',       default=os.cpu_count() or 1, type=int)
+    parser.add_argument('-o', '--output-dir', default='/opt/app/s/smd/lt')
+    parser.add_argument('--sort-run-size', default=extsort.RUN_SIZE, type=int, help='lines sorted in memory at once')
+    parser.add_argument('-t', '--tmp-dir', default=None, help='directory for temporary files, output directory by default')
+    global _args_
+    _args_ = parser.parse_args()
+    init_logger()
+    _logger_.debug( "Command-line arguments: {}".format(_args_) )
+    if not os.path.isdir(_args_.input_dir):
+        _logger_.error("Input directory '{}' does not exist, aborting ...".format(_args_.input_dir))
+        sys.exit(1)
+    if not os.path.isdir(_args_.output_dir):
+        _logger_.error("Output directory '{}' does not exist, aborting ...".format(_args_.output_dir))
+        sys.exit(1)
+
+
+def init_logger():
+    global _logger_
+    logging.basicConfig(format=LOG_FORMAT)
+    _logger_ = logging.getLogger("tag2corp")
+    pos2lt.init()
+    for logger in (_logger_, pos2lt._logger_):
+        if _args_.debug:
+            logger.setLevel( logging.DEBUG )
+        else:
+            logger.setLevel( logging.INFO )
+
+
+# Returns sort key giving the same order as "sort" in current locale,
+# None for C locale
+def get_sort_key():
+    name = locale.setlocale(locale.LC_COLLATE, '')
+    if name.split('.')[0] in ('C', 'POSIX'):
+        return None
+    return locale.strxfrm
+
+
+# Returns list of (file name, path) of non-empty input files
+def find_input_files():
+    files = []
+    for lett in LETTERS:
+        for fext in FILE_TYPES:
+            fname = "{}-{}.txt".format(lett, fext)
+            path = os.path.join(_args_.input_dir, lett, fname)
+            if os.path.isfile(path) and os.path.getsize(path) > 0:
+                files.append((fname, path))
+    return files
+
+
+# Initialization of worker process
+def init_worker(args):
+    global _args_
+    _args_ = args
+    # Sort key locale.strxfrm uses collation of worker process
+    locale.setlocale(locale.LC_COLLATE, '')
+    init_logger()
+
+
+# Tags one input file, writing tagged file to output directory
+# Sorted lines and sorted word forms are written to files in directory part_dir
+# Returns file name, sorted files, number of lines and distinct LT tags
+def tag_file(task):
+    ind, fname, path, part_dir, key = task
+    _logger_.info("Tagging {} with LT tags ...".format(fname))
+    pos2lt.DIST_TAGS.clear()
+    forms = extsort.RunWriter(_args_.sort_run_size, part_dir, key)
+    cnt = [ 0 ]
+
+    def tagged_lines(infile, outfile):
+        for line in infile:
+            cnt[0] += 1
+            out_line = pos2lt.tag_line(line)
+            if out_line is not None:
+                outfile.write(out_line)
+                forms.add(out_line.split('\t', 1)[0] + '\n')
+                yield out_line
+
+    corpus_part = os.path.join(part_dir, "{:03d}-corpus.part".format(ind))
+    words_part = os.path.join(part_dir, "{:03d}-words.part".format(ind))
+    try:
+        with open(path) as infile, \
+             open(os.path.join(_args_.output_dir, fname), 'w', encoding='utf-8', newline='') as outfile:
+            extsort.write_sorted(tagged_lines(infile, outfile), corpus_part, _args_.sort_run_size, part_dir, key=key)
+        forms.write(words_part)
+    finally:
+        forms.close()
+    return fname, corpus_part, words_part, cnt[0], set(pos2lt.DIST_TAGS)
+
+
+# Tags all input files, "-j" files at the same time, and merges them
+def tag_files():
+    files = find_input_files()
+    key = get_sort_key()
+    _logger_.info("Tagging {} files in {} jobs, sorting in locale '{}' ...".format(
+        len(files), _args_.jobs, locale.setlocale(locale.LC_COLLATE)))
+    corpus_parts = []
+    words_parts = []
+    dist_tags = set()
+    cnt = 0
+    part_dir = tempfile.mkdtemp(dir=_args_.tmp_dir or _args_.output_dir)
+    pool = None
+    try:
+        tasks = [ (ind, fname, path, part_dir, key) for ind, (fname, path) in enumerate(files) ]
+        if _args_.jobs > 1:
+            pool = multiprocessing.Pool(_args_.jobs, init_worker, (_args_,))
+            results = pool.imap(tag_file, tasks)
+        else:
+            results = map(tag_file, tasks)
+        # Results come in input order, so files are merged in that order
+        for fname, corpus_part, words_part, file_cnt, file_tags in results:
+            _logger_.info("Adding {} to word corpus ...".format(fname))
+            corpus_parts.append(corpus_part)
+            words_parts.append(words_part)
+            cnt += file_cnt
+            dist_tags.update(file_tags)
+        _logger_.info("Finished tagging: total {} lines.".format(cnt))
+        _logger_.info("Found following distinctive LT tags: {}".format(sorted(dist_tags)))
+        _logger_.info("Sorting corpuses ...")
+        corpus_file = os.path.join(_args_.output_dir, CORPUS_FILE)
+        lines = extsort.merge_files(corpus_parts, corpus_file, key=key)
+        _logger_.info("Serbian word corpus is ready in file '{}' ({} lines).".format(corpus_file, lines))
+        hunspell_file = os.path.join(_args_.output_dir, HUNSPELL_FILE)
+        lines = extsort.merge_files(words_parts, hunspell_file, key=key)
+        _logger_.info("Serbian word corpus for Hunspell is ready in file '{}' ({} lines).".format(hunspell_file, lines))
+    finally:
+        if pool is not None:
+            pool.terminate()
+        shutil.rmtree(part_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parse_args()
+    tag_files()
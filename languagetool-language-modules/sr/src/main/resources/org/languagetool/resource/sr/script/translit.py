@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Latin to Cyrillic transliteration used by lex2pos.py and wic2pos.py.
+
+Transliteration table (LAT_LIST => CIR_UTF_LIST) is compiled into:
+
+1. digraph pre-pass (Lj, Nj, Dž ...), done with str.replace
+2. str.translate table for all single letters
+
+Words from replace map (Eiffel => Ајфел) are then found in one pass using
+Aho-Corasick automaton from pyahocorasick package, and replaced taking
+leftmost-longest match first.
+When pyahocorasick is not installed, regular expression made of map keys
+(longest first) is used instead.
+
+Results are the same as with regular expressions used before:
+
+    _l2comp_.sub(lambda m: _l2conv_[m.group()], text)
+    _ciregex_.sub(lambda mo: _cirdict_[mo.group()], text)
+"""
+
+import re
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class Transliterator:
+
+    # Param lat_list: Latin letters and ligatures
+    # Param cir_list: Cyrillic letters and ligatures, same order as lat_list
+    # Param replace_map: dictionary of words replaced after transliteration
+    def __init__(self, lat_list, cir_list, replace_map=None):
+        conv = dict(zip(lat_list, cir_list))
+        singles = dict((lat, cir) for lat, cir in conv.items() if len(lat) == 1)
+        # Digraph is never matched if some key listed before it is its prefix
+        digraphs = list()
+        for ind, lat in enumerate(conv):
+            if len(lat) > 1 and not any(lat.startswith(prev) for prev in list(conv)[:ind]):
+                digraphs.append((lat, conv[ lat ]))
+        for lat, cir in digraphs:
+            if any(c in singles for c in cir):
+                raise ValueError("Digraph '{}' transliterates to Latin letter(s) '{}'".format(lat, cir))
+        self._table = str.maketrans(singles)
+        self._digraphs = digraphs
+        self._digraph_regex = None
+        if self._overlapping(digraphs):
+            self._digraph_regex = re.compile('|'.join(re.escape(lat) for lat, cir in digraphs))
+            self._digraph_map = dict(digraphs)
+        self._replace_map = replace_map or dict()
+        self._automaton = None
+        self._regex = None
+        if self._replace_map and ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for key, value in self._replace_map.items():
+                self._automaton.add_word(key, (len(key), value))
+            self._automaton.make_automaton()
+        elif self._replace_map:
+            keys = sorted(self._replace_map.keys(), key=len, reverse=True)
+            self._regex = re.compile("(%s)" % "|".join(re.escape(key) for key in keys))
+
+    # Chain of str.replace calls gives the same result as one regex scan
+    # only if no digraph suffix is prefix of another digraph
+    @staticmethod
+    def _overlapping(digraphs):
+        for first, cir in digraphs:
+            for second, cir in digraphs:
+                if any(second.startswith(first[i:]) for i in range(1, len(first))):
+                    return True
+        return False
+
+    # Transliterates Latin letters to Cyrillic letters
+    def latin_to_cyrillic(self, text):
+        if self._digraph_regex is not None:
+            text = self._digraph_regex.sub(lambda m: self._digraph_map[m.group()], text)
+        else:
+            for lat, cir in self._digraphs:
+                if lat in text:
+                    text = text.replace(lat, cir)
+        return text.translate(self._table)
+
+    # Replaces words according to replace map
+    def replace(self, text):
+        if self._automaton is not None:
+            # Automaton reports all (also overlapping) matches, so we take
+            # leftmost one and the longest of those starting at same position
+            matches = sorted((end - length + 1, -length, value)
+                for end, (length, value) in self._automaton.iter(text))
+            if not matches:
+                return text
+            parts = []
+            last = 0
+            for start, length, value in matches:
+                if start >= last:
+                    parts.append(text[last:start])
+                    parts.append(value)
+                    last = start - length
+            parts.append(text[last:])
+            return "".join(parts)
+        if self._regex is not None:
+            return self._regex.sub(lambda mo: self._replace_map[mo.group()], text)
+        return text
+
+    # Transliterates text and then replaces words according to replace map
+    def convert(self, text):
+        return self.replace(self.latin_to_cyrillic(text))
+
+
+# Transliteration as it was done in lex2pos.py and wic2pos.py before
+def _make_regex_converter(lat_list, cir_list, replace_map):
+    l2conv = dict(zip(lat_list, cir_list))
+    l2comp = re.compile('|'.join(l2conv))
+    keys = sorted(replace_map.keys(), key=len, reverse=True)
+    ciregex = re.compile("(%s)" % "|".join(re.escape(key) for key in keys))
+    def convert(text):
+        text = l2comp.sub(lambda m: l2conv[m.group()], text)
+        return ciregex.sub(lambda mo: replace_map[mo.string[mo.start():mo.end()]], text)
+    return convert
+
+
+# Compares regex and Transliterator conversion of "flexform<TAB>lemma" pairs
+# taken from input file (lex or wic format)
+def _benchmark(input_file, map_file, lines):
+    import time
+    from lex2pos import LAT_LIST, CIR_UTF_LIST
+    with open(map_file) as infile:
+        replace_map = dict(x.strip().split(None, 1) for x in infile if x.strip())
+    pairs = []
+    with open(input_file) as f:
+        for line in f:
+            tokens = line.strip().split('\t')
+            if len(tokens) >= 2:
+                pairs.append("{}\t{}".format(tokens[0], tokens[1]))
+            if len(pairs) == lines:
+                break
+    print("Converting {} pairs, replace map has {} words, pyahocorasick {}".format(
+        len(pairs), len(replace_map), "installed" if ahocorasick else "not installed"))
+    results = []
+    for name, convert in (('regex', _make_regex_converter(LAT_LIST, CIR_UTF_LIST, replace_map)),
+                          ('translit', Transliterator(LAT_LIST, CIR_UTF_LIST, replace_map).convert)):
+        start = time.perf_counter()
+        results.append([ convert(pair) for pair in pairs ])
+        elapsed = time.perf_counter() - start
+        print("{:<10} {:>10.3f} s".format(name, elapsed))
+    if results[0] != results[1]:
+        print("ERROR: Results differ")
+
+
+# Run benchmark by running this module directly
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description='Benchmarks Latin to Cyrillic transliteration.')
+    parser.add_argument('-i', '--input-file', required=True)
+    parser.add_argument('-m', '--map-file',   required=True)
+    parser.add_argument('-n', '--first-n-lines', default=0, type=int)
+    args = parser.parse_args()
+    _benchmark(args.input_file, args.map_file, args.first_n_lines)
@@ -11,9 +11,18 @@
 
 import argparse
 import logging
-import re
+import multiprocessing
 import os
+import shutil
 import sys
+import tempfile
+
+import corpus
+import extsort
+import quarantine
+import router
+import shard
+import translit
 
 """
 Program reads morphologic dictionary from a single file, line by line, splitting entries into
@@ -24,8 +33,12 @@ If lemma == "apple", then whole line goes to file "a-words.txt" etc.
 If entries are in Croatian Latin script, they will be converted into Serbian Cyrillic script.
 """
 
-_args_, _logger_, _l2comp_, _l2conv_, _ciregex_, _freqs_, _cirdict_ = None, None, None, None, None, list(), None
+_args_, _logger_, _translit_, _freqs_, _cirdict_ = None, None, None, list(), None
 _freqmap_ = dict()
+_quarantine_ = None
+# WIC tag => POS tag, and WIC tag => [error message, first flexform, count]
+# for tags which could not be converted
+_postags_, _tagerrors_ = dict(), dict()
 
 LOG_FORMAT = '%(asctime)-15s %(levelname)s %(message)s'
 CYR_LETTERS = {
@@ -79,10 +92,16 @@ REGEX_TYPE = {
     "wic" : "^([!\"\'\(\),\-\.:;\?]|[a-zčćžšđâêîôûﬂǌüöäø’A-ZČĆŽŠĐ0-9_\-]+)\s+([!\"\'\(\),\-\.:;\?]|[a-zčćžšđâêîôûﬂǌüöäø’A-ZČĆŽŠĐ0-9_\-]+)\s+(a-zA-Z0-2_)+*"
 }
 
-BAD_GROUPS = ('ü', 'ö', 'ä', 'ø', 'аа', 'ии', 'уу', 'цх', 'тз', 'цз', 'q', 'w', 'x', 'y', 'Q', 'W', 'X', 'Y', 'Ä', 'Ü', 'Ö', 'è', 'à', 'фф', 'бб', 'зз', 'лл', 'мм', 'нн', 'пп', 'рр', 'сс', 'тт', 'гх', 'тх', 'хх')
+# Groups of letters, which put word into "bad" file, by reason code
+BAD_GROUPS = {
+    'foreign-letter'   : ('ü', 'ö', 'ä', 'ø', 'q', 'w', 'x', 'y', 'Q', 'W', 'X', 'Y', 'Ä', 'Ü', 'Ö', 'è', 'à'),
+    'double-vowel'     : ('аа', 'ии', 'уу'),
+    'double-consonant' : ('фф', 'бб', 'зз', 'лл', 'мм', 'нн', 'пп', 'рр', 'сс', 'тт', 'хх'),
+    'foreign-cluster'  : ('цх', 'тз', 'цз', 'гх', 'тх')
+}
 
-# Map holding transliterated Serbian Cyrillic letters pointing to
-# descriptors of opened files
+# Router holding transliterated Serbian Cyrillic letters pointing to
+# output files
 WORD_FILES = {}
 
 # List (or better: tupple) of Croatian Latin letters and ligatures
@@ -94,19 +113,21 @@ CIR_UTF_LIST = (u"Ђ", u"Џ", u"Џ", u"Љ", u"Љ", u"Њ", u"Њ", u"А", u"Б", u
 def parse_args():
     parser = argparse.ArgumentParser(description='Processes file containing Serbian word corpus.')
     parser.add_argument('-b', '--base-dir',   default='/tmp')
+    parser.add_argument('--benchmark', action ='store_true', default=False, help='only measure conversion of tags of input file')
+    parser.add_argument('--buffer-size', default=router.BUFFER_SIZE, type=int, help='lines buffered for each output file')
     parser.add_argument('-d', '--debug',      action ='store_true', default=False)
     parser.add_argument('-i', '--input-file', default=None)
+    parser.add_argument('-j', '--jobs',       default=1, type=int)
+    parser.add_argument('--max-open-files', default=router.MAX_OPEN, type=int)
     parser.add_argument('-m', '--map-file', default=None)
     parser.add_argument('-n', '--first-n-lines', default=0, type=int)
     parser.add_argument('-r', '--regex',      default=None)
-    global _args_, _logger_
+    parser.add_argument('--sort', action ='store_true', default=False, help='sort word files, removing duplicate lines')
+    parser.add_argument('--sort-run-size', default=extsort.RUN_SIZE, type=int, help='lines sorted in memory at once')
+    parser.add_argument('-t', '--tmp-dir', default=None, help='directory for temporary files, base directory by default')
+    global _args_
     _args_ = parser.parse_args()
-    logging.basicConfig(format=LOG_FORMAT)
-    _logger_ = logging.getLogger("wic2lt")
-    if _args_.debug:
-        _logger_.setLevel( logging.DEBUG )
-    else:
-        _logger_.setLevel( logging.INFO )
+    init_logger()
     _logger_.debug( "Command-line arguments: {}".format(_args_) )
     if not _args_.input_file:
         _logger_.error("Input file (-i) was not specified, aborting ...")
@@ -123,64 +144,65 @@ def parse_args():
     if not os.path.exists(_args_.map_file):
         _logger_.error("Map file '{}' does not exist, aborting ...".format(_args_.map_file))
         sys.exit(1)
+    if _args_.jobs > 1 and _args_.first_n_lines > 0:
+        _logger_.warn("Option -n can not be used with parallel jobs, using 1 job ...")
+        _args_.jobs = 1
+
+
+def init_logger():
+    global _logger_
+    logging.basicConfig(format=LOG_FORMAT)
+    _logger_ = logging.getLogger("wic2lt")
+    if _args_.debug:
+        _logger_.setLevel( logging.DEBUG )
+    else:
+        _logger_.setLevel( logging.INFO )
 
 
 # Open files for writing words in directory specified with "-b" option
-# Files are opened in append mode
+# Files are written through router, which buffers lines for each of them
 def open_out_files():
     global WORD_FILES
+    WORD_FILES = router.OutputRouter(_args_.buffer_size, _args_.max_open_files)
     for cl, lett in CYR_LETTERS.items():
         out_dir = os.path.join(_args_.base_dir, lett)
         if not os.path.exists( out_dir ):
             os.makedirs( out_dir )
-        WORD_FILES[ cl ] = list()
-        _logger_.debug( "Opening file {}/{}-wic-words.txt ...".format(out_dir, lett) )
-        WORD_FILES[ cl ].append( open( os.path.join(out_dir, lett + '-wic-words.txt'), 'wb' ) )
-        _logger_.debug( "Opening file {}/{}-wic-names.txt ...".format(out_dir, lett) )
-        WORD_FILES[ cl ].append( open( os.path.join(out_dir, lett + '-wic-names.txt'), 'wb' ) )
+        _logger_.debug( "Opening files {0}/{1}-wic-words.txt and {0}/{1}-wic-names.txt ...".format(out_dir, lett) )
+        WORD_FILES.add( cl, [ os.path.join(out_dir, lett + '-wic-words.txt'), os.path.join(out_dir, lett + '-wic-names.txt') ] )
 
 
 # Close all files containing words
 def close_out_files():
-    for cl, lett_files in WORD_FILES.items():
-        _logger_.debug('Closing file {}-wic-words.txt ...'.format(CYR_LETTERS[ cl ]))
-        lett_files[0].close()
-        _logger_.debug('Closing file {}-wic-names.txt ...'.format(CYR_LETTERS[ cl ]))
-        lett_files[1].close()
+    _logger_.debug('Closing word files ...')
+    WORD_FILES.close()
+    _logger_.info('Word files: {}.'.format(WORD_FILES))
+
+
+# Sort files containing words, removing duplicate lines
+def sort_out_files():
+    paths = WORD_FILES.paths()
+    _logger_.info("Sorting {} word files ...".format(len(paths)))
+    cnt = extsort.sort_files(paths, _args_.sort_run_size, _args_.tmp_dir or _args_.base_dir, jobs=_args_.jobs)
+    _logger_.info("Sorted word files: {} distinct lines.".format(cnt))
 
 
 # Initialization
 def init():
-    global _l2conv_, _l2comp_, _ciregex_, _cirdict_
-    # Create conversion dictionary for Latin to Cyrillic conversion
-    _l2conv_ = dict(zip(LAT_LIST, CIR_UTF_LIST))
-    _logger_.debug("Conversion dictionary Lat/Cir: {}".format(_l2conv_))
-    _l2comp_ = re.compile('|'.join(_l2conv_))
+    global _translit_, _cirdict_, _quarantine_
     # Read map file and populate map dictionary
     with open(_args_.map_file) as infile:
         _cirdict_ = dict(x.strip().split(None, 1) for x in infile if x.strip())
-    # Compile dictionary
-    keys = sorted(_cirdict_.keys(), key=len, reverse=True)
-    expression = []
-    for item in keys:
-        expression.append(re.escape(item))
     _logger_.debug("Replace map: {}".format(_cirdict_))
-    # Create a regular expression  from the dictionary keys
-    _ciregex_ = re.compile("(%s)" % "|".join(expression))
+    # Compile Latin to Cyrillic conversion and replace map
+    _translit_ = translit.Transliterator(LAT_LIST, CIR_UTF_LIST, _cirdict_)
+    _quarantine_ = quarantine.Quarantine(BAD_GROUPS)
 
 
 # Determine output file for word tripple
 # based on first letter of lemma
 def get_words_out_file( first_char ):
-    if first_char.lower() in WORD_FILES:
-        # Is this really a lower case?
-        if first_char == first_char.lower():
-            out_file = WORD_FILES[ first_char.lower() ][0]
-        else:
-            out_file = WORD_FILES[ first_char.lower() ][1]
-    else:
-        out_file = WORD_FILES[ 'misc' ][0]
-    return out_file
+    return router.route(WORD_FILES, first_char)
 
 numeral_map = tuple(zip(
     (1000, 900, 500, 400, 100, 90, 50, 40, 10, 9, 5, 4, 1),
@@ -297,6 +319,11 @@ conjunction_types = {
     '0'    : '-'
 }
 
+# Raised by get*Tag functions for unknown parts of WIC tag
+class TagError(Exception):
+    pass
+
+
 # Adjective (А) - придев
 def getAdjectiveTag(flexform, parts):
     try:
@@ -306,8 +333,7 @@ def getAdjectiveTag(flexform, parts):
         gender = gender_types[ parts[3] ]
         degree = degree_types[ parts[4] ]
     except KeyError:
-        _logger_.error("getAdjectiveTag: Error parsing tag '{}', flexform '{}'".format(parts, flexform))
-        sys.exit(1)
+        raise TagError("getAdjectiveTag: Error parsing tag '{}'".format(parts))
     return "A" + atype + degree + gender + number + case
 
 # Adverb (Adv) - прилог
@@ -316,8 +342,7 @@ def getAdverbTag(flexform, parts):
         atype = adverb_types[ parts[0] ]
         degree = degree_types[ parts[1] ]
     except KeyError:
-        _logger_.error("getAdverbTag: Error parsing tag '{}', flexform '{}'".format(parts, flexform))
-        sys.exit(1)
+        raise TagError("getAdverbTag: Error parsing tag '{}'".format(parts))
     return "R" + atype + degree
 
 # Conjunction - везник
@@ -325,8 +350,7 @@ def getConjunctionTag(flexform, parts):
     try:
         ctype = conjunction_types[ parts[0] ]
     except KeyError:
-        _logger_.error("getConjunctionTag: Error parsing tag '{}', flexform '{}'".format(parts, flexform))
-        sys.exit(1)
+        raise TagError("getConjunctionTag: Error parsing tag '{}'".format(parts))
     return "C" + ctype
 
 # Interjection - узвик
@@ -341,8 +365,7 @@ def getNounTag(flexform, parts):
         number = number_types[ parts[2] ]
         gender = gender_types[ parts[3] ]
     except KeyError:
-        _logger_.error("getNounTag: Error parsing tag '{}', flexform '{}'".format(parts, flexform))
-        sys.exit(1)
+        raise TagError("getNounTag: Error parsing tag '{}'".format(parts))
     return "N" + ntype + gender + number + case
 
 # Numeral - број
@@ -353,8 +376,7 @@ def getNumeralTag(flexform, parts):
         number = number_types[ parts[2] ]
         case   = case_types[ parts[3] ]
     except KeyError:
-        _logger_.error("getNumeralTag: Error parsing tag '{}', flexform '{}'".format(parts, flexform))
-        sys.exit(1)
+        raise TagError("getNumeralTag: Error parsing tag '{}'".format(parts))
     return "Ml" + ntype + gender + number + case
 
 # Pronoun - заменица
@@ -366,8 +388,7 @@ def getPronounTag(flexform, parts):
         gender = gender_types[ parts[3] ]
         case   = case_types[ parts[4] ]
     except KeyError:
-        _logger_.error("getPronounTag: Error parsing tag '{}', flexform '{}'".format(parts, flexform))
-        sys.exit(1)
+        raise TagError("getPronounTag: Error parsing tag '{}'".format(parts))
     return "P" + ptype + person + gender + number + case
 
 # Preposition - предлог
@@ -384,30 +405,34 @@ def getVerbTag(flexform, parts):
         gender   = gender_types[ parts[4] ]
         negation = parts[5]
     except KeyError:
-        _logger_.error("getVerbTag: Error parsing tag '{}', flexform '{}'".format(parts, flexform))
-        sys.exit(1)
+        raise TagError("getVerbTag: Error parsing tag '{}'".format(parts))
     return "V" + vtype + vform + person + number + gender + negation
 
 
-# Maps tags to "normal" POS tags
-def getPOStag(lemma, wictag):
-    # Pointers to functions ... last seen in C long time ago ...
-    switch_word_type = {
-        'A'    : getAdjectiveTag,    # Adjective - придев
-        'Adv'  : getAdverbTag,       # Adverb - прилог
-        'C'    : getConjunctionTag,  # Conjunction - везник
-        'I'    : getInterjectionTag, # Interjection - узвик
-        'N'    : getNounTag,         # Noun - именица
-        'Num'  : getNumeralTag,      # Numeral - број
-        'P'    : getPronounTag,      # Pronoun - заменица
-        'Prep' : getPrepositionTag,  # Preposition - предлог
-        'V'    : getVerbTag          # Verb - глагол
-    }
+# Pointers to functions ... last seen in C long time ago ...
+SWITCH_WORD_TYPE = {
+    'A'    : getAdjectiveTag,    # Adjective - придев
+    'Adv'  : getAdverbTag,       # Adverb - прилог
+    'C'    : getConjunctionTag,  # Conjunction - везник
+    'I'    : getInterjectionTag, # Interjection - узвик
+    'N'    : getNounTag,         # Noun - именица
+    'Num'  : getNumeralTag,      # Numeral - број
+    'P'    : getPronounTag,      # Pronoun - заменица
+    'Prep' : getPrepositionTag,  # Preposition - предлог
+    'V'    : getVerbTag          # Verb - глагол
+}
+
+
+# Converts WIC tag to "normal" POS tag, raises TagError
+def convertPOStag(lemma, wictag):
     # Split tag to parts
     tagparts = wictag.split('_')
     wtype = tagparts[0]
-    if wtype in switch_word_type:
-        retval = switch_word_type[ wtype ](lemma, tagparts[1:]) # There is no "apply" global function in Python 3
+    if wtype in SWITCH_WORD_TYPE:
+        try:
+            retval = SWITCH_WORD_TYPE[ wtype ](lemma, tagparts[1:]) # There is no "apply" global function in Python 3
+        except IndexError:
+            raise TagError("{}: Too few parts in tag '{}'".format(SWITCH_WORD_TYPE[ wtype ].__name__, tagparts[1:]))
         # Remove last 4, 3, 2 or 1 continuous series of dashes from the end of tag
         for i in range(4, 0, -1):
             ind = retval.rfind('-' * i)
@@ -419,83 +444,232 @@ def getPOStag(lemma, wictag):
         return "0"
 
 
+# Maps tags to "normal" POS tags
+# There is only a small number of distinct WIC tags, so each one is
+# converted once. Tags which can not be converted are mapped to "0" (word
+# is skipped) and reported at the end, see report_tag_errors()
+def getPOStag(lemma, wictag):
+    posgr = _postags_.get(wictag)
+    if posgr is not None:
+        return posgr
+    err = _tagerrors_.get(wictag)
+    if err is None:
+        try:
+            posgr = convertPOStag(lemma, wictag)
+            _postags_[ wictag ] = posgr
+            return posgr
+        except TagError as e:
+            err = _tagerrors_[ wictag ] = [ str(e), lemma, 0 ]
+    err[2] += 1
+    return "0"
+
+
+# Adds tag errors of worker process
+def merge_tag_errors(errors):
+    for wictag, (message, flexform, count) in errors.items():
+        if wictag in _tagerrors_:
+            _tagerrors_[ wictag ][2] += count
+        else:
+            _tagerrors_[ wictag ] = [ message, flexform, count ]
+
+
+# Logs all tags which could not be converted
+# Returns True if there were any
+def report_tag_errors():
+    for wictag, (message, flexform, count) in sorted(_tagerrors_.items()):
+        _logger_.error("{} (WIC tag '{}'): {} rows skipped, first flexform '{}'".format(message, wictag, count, flexform))
+    if _tagerrors_:
+        _logger_.error("Could not convert {} distinct WIC tags in {} rows.".format(
+            len(_tagerrors_), sum(err[2] for err in _tagerrors_.values())))
+    return bool(_tagerrors_)
+
+
+# Returns "reason:group" if word contains some of BAD_GROUPS, otherwise None
 def has_bad_letters(word):
-    return any(x in word for x in BAD_GROUPS)
+    found = _quarantine_.match(word)
+    if found is None:
+        return None
+    return "{}:{}".format(*found)
 
 # Parse input file
 def parse_file():
-    cnt = 0
-    matchcnt = 0
     _logger_.info("Started processing input file '{}' ...".format(_args_.input_file))
 
     with open(_args_.input_file) as f:
-        for line in f:
-            # Remove end of line
-            line = line.strip()
-            cnt += 1
-            tokens = line.split('\t')
-            if len(tokens) == 3:
-                matchcnt += 1
-                flexform, lemma, wictag = tokens
-                # Some tags seems fishy, so better skip them
-                if wictag.startswith('A_pos') \
-                or wictag.startswith('A_dem') \
-                or wictag.startswith('A_indef') \
-                or wictag.startswith('A_inter') \
-                or wictag.startswith('A_rel'):
-                    continue
-                # We need to do transliterating here in order to avoid transliterating POS tag :(
-                flexform_lemma = "{}\t{}".format(flexform, lemma)
-                # Transliterate all words in line, replacing Latin with Cyrillic characters
-                flexform_lemma = _l2comp_.sub(lambda m: _l2conv_[m.group()], flexform_lemma)
-                # Replace words according to word replace map (Eiffel => Ајфел)
-                flexform_lemma = _ciregex_.sub(lambda mo: _cirdict_[mo.string[mo.start():mo.end()]], flexform_lemma)
-                # Check lemma for non-transliterated letters or some foreign letter combination
-                # If they are found, write lemma in separate file
-                # That will help in creating replacements
-                if has_bad_letters(flexform_lemma):
-                    out_file = WORD_FILES[ 'bad' ][0]
-                    posgr = getPOStag(flexform, wictag)
-                    out_file.write("{}\t{}\t0\n".format(flexform_lemma, posgr).encode('utf-8'))
-                    continue
-                # Split pair again after transliteration
-                tokens = flexform_lemma.split()
-                try:
-                    flexform, lemma = tokens
-                except ValueError:
-                    _logger_.error("Too many values to unpack: tokens '{}', line '{}'".format(tokens, line))
-                    continue
-                posgr = getPOStag(flexform, wictag)
-                _logger_.debug('Converted flexform={}, lemma={}, posgr={}'.format(flexform, lemma, posgr))
-                if posgr[0] in ( 'M', 'S', '0' ) or (len(posgr) in (1,2) and posgr[0] in ('N', 'A', 'V')):
-                    # We will skip:
-                    # 1. prepositions because of lack of information about the case they go with
-                    # 2. numerals because of lack of type
-                    # 3. words where we could not generate postag
-                    continue
-                # Determine file to write line in ...
-                out_file = get_words_out_file(lemma[0])
-                # Create line for writing in file
-                out_file.write("{}\t{}\t{}\t0\n".format(flexform, lemma, posgr).encode('utf-8'))
-            else:
-                _logger_.warn("Unmatched line: {}".format(line))
-            if cnt > _args_.first_n_lines > 0:
-                break
+        cnt, matchcnt = parse_lines(f)
         f.close()
-    # Generate Roman numerals from 11 to 1000 and add them as word types
+    write_roman_numerals()
+    _logger_.info("Finished processing input file '{}': total {} lines, {} matching lines.".format(
+        _args_.input_file, cnt, matchcnt))
+
+
+# Converts lines of input file to rows (corpus.Row) with words transliterated
+# to Cyrillic and WIC tags converted to POS tags, yielding (row, reason)
+# Reason is "reason:group" for row with bad letters (see has_bad_letters()),
+# otherwise None. Rows which would not be written are skipped
+# Numbers of lines and matching lines are added to stats
+def convert_lines(lines, stats):
+    for line in lines:
+        # Remove end of line
+        line = line.strip()
+        stats[ 'lines' ] += 1
+        tokens = line.split('\t')
+        if len(tokens) == 3:
+            stats[ 'matched' ] += 1
+            flexform, lemma, wictag = tokens
+            # Some tags seems fishy, so better skip them
+            if wictag.startswith('A_pos') \
+            or wictag.startswith('A_dem') \
+            or wictag.startswith('A_indef') \
+            or wictag.startswith('A_inter') \
+            or wictag.startswith('A_rel'):
+                continue
+            # We need to do transliterating here in order to avoid transliterating POS tag :(
+            flexform_lemma = "{}\t{}".format(flexform, lemma)
+            # Transliterate all words in line, replacing Latin with Cyrillic characters
+            # and then replace words according to word replace map (Eiffel => Ајфел)
+            flexform_lemma = _translit_.convert(flexform_lemma)
+            # Check lemma for non-transliterated letters or some foreign letter combination
+            # If they are found, write lemma in separate file
+            # That will help in creating replacements
+            reason = has_bad_letters(flexform_lemma)
+            if reason:
+                posgr = getPOStag(flexform, wictag)
+                flexform, lemma = flexform_lemma.split('\t')
+                yield corpus.Row(flexform, lemma, posgr, 0), reason
+                continue
+            # Split pair again after transliteration
+            tokens = flexform_lemma.split()
+            try:
+                flexform, lemma = tokens
+            except ValueError:
+                _logger_.error("Too many values to unpack: tokens '{}', line '{}'".format(tokens, line))
+                continue
+            posgr = getPOStag(flexform, wictag)
+            _logger_.debug('Converted flexform={}, lemma={}, posgr={}'.format(flexform, lemma, posgr))
+            if posgr[0] in ( 'M', 'S', '0' ) or (len(posgr) in (1,2) and posgr[0] in ('N', 'A', 'V')):
+                # We will skip:
+                # 1. prepositions because of lack of information about the case they go with
+                # 2. numerals because of lack of type
+                # 3. words where we could not generate postag
+                continue
+            yield corpus.Row(flexform, lemma, posgr, 0), None
+        else:
+            _logger_.warn("Unmatched line: {}".format(line))
+        if stats[ 'lines' ] > _args_.first_n_lines > 0:
+            break
+
+
+# Parse lines of input file, writing them to WORD_FILES
+# Returns number of lines and number of matching lines
+def parse_lines(lines):
+    stats = dict(lines=0, matched=0)
+    for row, reason in convert_lines(lines, stats):
+        if reason:
+            out_file = WORD_FILES[ 'bad' ][0]
+            out_file.write("{}\t{}\n".format(row.line()[:-1], reason))
+            continue
+        # Determine file to write line in ...
+        out_file = get_words_out_file(row.lemma[0])
+        # Create line for writing in file
+        out_file.write(row.line())
+    return stats[ 'lines' ], stats[ 'matched' ]
+
+
+# Generate Roman numerals from 11 to 1000 and add them as word types
+def write_roman_numerals():
     for i in range(11,1000):
         roman = int_to_roman(i)
         out_file = get_words_out_file(str(i % 10))
-        out_file.write("{}\t{}\tMrc\t0\n".format(roman, roman).encode('utf-8'))
+        out_file.write(corpus.Row(roman, roman, 'Mrc', 0).line())
         roman = roman.lower()
-        out_file.write("{}\t{}\tMrc\t0\n".format(roman, roman).encode('utf-8'))
+        out_file.write(corpus.Row(roman, roman, 'Mrc', 0).line())
+
+
+# Replays tags of input file, converting each one with convertPOStag()
+# and with getPOStag(), which converts each distinct tag only once
+def benchmark_tags():
+    import time
+    rows = []
+    with open(_args_.input_file) as f:
+        for line in f:
+            tokens = line.strip().split('\t')
+            if len(tokens) == 3:
+                rows.append((tokens[0], tokens[2]))
+        f.close()
+    _logger_.info("Replaying {} tags, {} distinct ...".format(len(rows), len(set(row[1] for row in rows))))
+    def convert(lemma, wictag):
+        try:
+            return convertPOStag(lemma, wictag)
+        except TagError:
+            return "0"
+    results = []
+    for name, method in (('convertPOStag', convert), ('getPOStag', getPOStag)):
+        start = time.perf_counter()
+        results.append([ method(lemma, wictag) for lemma, wictag in rows ])
+        elapsed = time.perf_counter() - start
+        _logger_.info("{:<15} {:>8.3f} s {:>12.0f} rows/s".format(name, elapsed, len(rows) / elapsed))
+    if results[0] != results[1]:
+        _logger_.error("Results differ")
+
+
+# Initialization of worker process in parallel mode
+def init_worker(args):
+    global _args_
+    _args_ = args
+    init_logger()
+    init()
+
+
+# Converts one chunk of input file in worker process
+# Output is written to partial files in directory part_dir
+def convert_chunk(chunk):
+    global WORD_FILES
+    ind, start, end, part_dir = chunk
+    WORD_FILES = shard.make_buffers(CYR_LETTERS, 2)
+    _tagerrors_.clear()
+    cnt, matchcnt = parse_lines(shard.read_lines(_args_.input_file, start, end))
+    parts = shard.write_parts(part_dir, ind, WORD_FILES)
+    return parts, dict(_tagerrors_), cnt, matchcnt
+
+
+# Converts input file in parallel, each worker converting one chunk of it
+def parallel():
+    chunks = shard.split_file(_args_.input_file, _args_.jobs)
+    _logger_.info("Started processing input file '{}' in {} chunks, {} jobs ...".format(
+        _args_.input_file, len(chunks), _args_.jobs))
+    cnt = 0
+    matchcnt = 0
+    part_dir = tempfile.mkdtemp(dir=_args_.base_dir)
+    try:
+        with multiprocessing.Pool(_args_.jobs, init_worker, (_args_,)) as pool:
+            tasks = [ (ind, start, end, part_dir) for ind, (start, end) in enumerate(chunks) ]
+            # Results come in input order, so partial files are merged in that order
+            for parts, errors, chunk_cnt, chunk_matchcnt in pool.imap(convert_chunk, tasks):
+                shard.merge_parts(parts, WORD_FILES)
+                merge_tag_errors(errors)
+                cnt += chunk_cnt
+                matchcnt += chunk_matchcnt
+    finally:
+        shutil.rmtree(part_dir, ignore_errors=True)
+    write_roman_numerals()
     _logger_.info("Finished processing input file '{}': total {} lines, {} matching lines.".format(
         _args_.input_file, cnt, matchcnt))
 
 
 if __name__ == "__main__":
     parse_args()
+    if _args_.benchmark:
+        benchmark_tags()
+        sys.exit(0)
     init()
     open_out_files()
-    parse_file()
+    if _args_.jobs > 1:
+        parallel()
+    else:
+        parse_file()
     close_out_files()
+    if _args_.sort:
+        sort_out_files()
+    if report_tag_errors():
+        sys.exit(1)
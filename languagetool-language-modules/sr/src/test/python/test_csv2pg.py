@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+"""
+Test of parallel mode of csv2pg.py (option -w), run against SQLite stand-in
+of PostgreSQL database (see dbpool.SqlitePool).
+
+Usage:
+    python3 test_csv2pg.py
+"""
+
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+
+SCRIPT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          '..', '..', 'main', 'resources', 'org', 'languagetool', 'resource', 'sr', 'script')
+
+CONFIG = """[DB]
+driver=sqlite
+database={}
+word_exists_batch=SELECT b.* FROM csv2pg_batch b WHERE NOT EXISTS (SELECT 1 FROM words w WHERE w.wordform=b.wordform AND w.lemma=b.lemma AND w.msd LIKE b.msd || '%%')
+word_insert_batch=INSERT INTO words VALUES (?, ?, ?, ?)
+"""
+
+# Rows with negative frequency are refused by database, so batch with such row fails
+CREATE_TABLE = "CREATE TABLE words (wordform text, lemma text, msd text, frequency text CHECK (CAST(frequency AS INTEGER) >= 0))"
+
+
+class ParallelTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.database = os.path.join(self.tmp_dir.name, 'words.db')
+        self.config_file = os.path.join(self.tmp_dir.name, 'csv2pg.ini')
+        with open(self.config_file, 'w') as f:
+            f.write(CONFIG.format(self.database))
+        with sqlite3.connect(self.database) as conn:
+            conn.execute(CREATE_TABLE)
+            # Every fifth word is in database already
+            conn.executemany("INSERT INTO words VALUES (?, ?, ?, ?)",
+                             [ ("реч{}".format(i), "реч{}".format(i), "Ncmsn", "1") for i in range(0, 500, 5) ])
+        conn.close()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def run_csv2pg(self, lines, *args):
+        input_file = os.path.join(self.tmp_dir.name, 'words.txt')
+        with open(input_file, 'w') as f:
+            f.writelines(lines)
+        out_dir = os.path.join(self.tmp_dir.name, 'out')
+        os.mkdir(out_dir)
+        subprocess.run([ sys.executable, os.path.join(SCRIPT_DIR, 'csv2pg.py'), '-c', self.config_file,
+                         '-i', input_file, '-o', out_dir ] + list(args),
+                       check=True, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        self.assertEqual(sorted(os.listdir(out_dir)), [ 'words.txt' ])
+        with open(os.path.join(out_dir, 'words.txt'), encoding='utf-8') as f:
+            return f.read()
+
+    def test_workers(self):
+        lines = [ "реч{}\tреч{}\tNcmsn\t{}\n".format(i, i, i) for i in range(500) ]
+        # Filtered line is written to output file as it is read
+        lines.insert(10, "Wреч\tWреч\tNcmsn\t1\n")
+        # Batch of words 250-299 fails on word 261, which is not in database
+        lines[ 262 ] = "реч261\tреч261\tNcmsn\t-1\n"
+        out = self.run_csv2pg(lines, '-w', '4', '-s', '50')
+        with sqlite3.connect(self.database) as conn:
+            words = set(row[0] for row in conn.execute("SELECT wordform FROM words"))
+        conn.close()
+        failed = lines[ 251:301 ]
+        expected = set("реч{}".format(i) for i in range(500) if i % 5 == 0 or not 250 <= i < 300)
+        self.assertEqual(words, expected)
+        # Rows of failed batch are appended to output file after filtered lines
+        self.assertEqual(out, "Wреч\tWреч\tNcmsn\t1" + "".join(failed))
+
+
+if __name__ == '__main__':
+    unittest.main()